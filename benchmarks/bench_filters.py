@@ -0,0 +1,261 @@
+"""Throughput benchmarks for the message filters.
+
+Runs the filters and Events.scan_message over generated message corpora with the filter lists
+in the in-memory database and mocked discord objects, so no database or Discord connection is needed.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_filters
+    python -m benchmarks.bench_filters --save-baseline bench_baseline.json
+    python -m benchmarks.bench_filters --baseline bench_baseline.json
+
+Exits with status 1 if a benchmark is under its minimum throughput, or more than
+the tolerance slower than the baseline."""
+
+import argparse
+import asyncio
+import json
+import random
+import string
+import sys
+import time
+
+from types import SimpleNamespace
+from unittest import mock
+
+import discord
+
+from utils.database import FilterKind, FilteredWord, LevenshteinWord, ApprovedInvite, MemoryDatabase
+from utils.filters import FiltersManager, ScanContext
+from utils.metrics import RollingSamples
+
+# Minimum messages/s when no baseline is given, low enough to pass on slow CI machines.
+# The long corpus has messages close to the 4000 character limit and gets its own budget.
+BUDGETS = {
+    'match_filtered_words': {'default': 5000, 'long': 200},
+    'match_levenshtein_words': {'default': 1000},
+    'search_invite': {'default': 50000},
+    'scan_message': {'default': 100, 'long': 50},
+}
+
+VOCABULARY = ('hello', 'my', '3ds', 'is', 'stuck', 'on', 'the', 'black', 'screen', 'after', 'installing', 'luma',
+              'can', 'someone', 'help', 'with', 'atmosphere', 'update', 'switch', 'sd', 'card', 'format', 'fat32',
+              'homebrew', 'launcher', 'thanks', 'guide', 'nand', 'backup', 'emunand', 'hekate', 'payload', 'lol',
+              'wii', 'u', 'tiramisu', 'aroma', 'boot9strap', 'godmode9', 'cia', 'title', 'error', 'code', 'why')
+DOMAINS = ('discord.com', 'steamcommunity.com', 'nintendo.com', 'github.com', 'dropbox.com', 'epicgames.com')
+UNICODE_CHUNKS = ('こんにちは', '你好世界', 'Привет', '🎮🕹️👾', 'ｆｕｌｌｗｉｄｔｈ', 'z̷̢a̵l̶g̸o̴', 'مرحبا', '🔥' * 8)
+
+
+def random_word(rng: random.Random, low: int, high: int) -> str:
+    return ''.join(rng.choices(string.ascii_lowercase + string.digits, k=rng.randint(low, high)))
+
+
+def typo(rng: random.Random, word: str) -> str:
+    """Changes, inserts or removes a character outside the TLD."""
+    name, _, tld = word.rpartition('.')
+    pos = rng.randrange(len(name))
+    op = rng.randrange(3)
+    if op == 0:
+        name = name[:pos] + rng.choice(string.ascii_lowercase) + name[pos + 1:]
+    elif op == 1:
+        name = name[:pos] + rng.choice(string.ascii_lowercase) + name[pos:]
+    else:
+        name = name[:pos] + name[pos + 1:]
+    return f'{name}.{tld}'
+
+
+def make_filter_lists(rng: random.Random, filtered_words: int, levenshtein_words: int) -> dict:
+    kinds = list(FilterKind)
+    filtered = {random_word(rng, 4, 12): rng.choice(kinds) for _ in range(filtered_words)}
+    levenshtein = {f'{random_word(rng, 5, 12)}.{rng.choice(("com", "gg", "net", "ru"))}': rng.randint(1, 3)
+                   for _ in range(levenshtein_words - len(DOMAINS))}
+    levenshtein.update({domain: 3 for domain in DOMAINS})
+    return {
+        'whitelist': list(DOMAINS),
+        'filtered': [FilteredWord(word=w, kind=k) for w, k in filtered.items()],
+        'levenshtein': [LevenshteinWord(word=w, threshold=t, kind=FilterKind.ScammingSite) for w, t in levenshtein.items()],
+        'invites': [ApprovedInvite(code=random_word(rng, 6, 10), uses=-1, alias=f'server{n}') for n in range(50)],
+    }
+
+
+async def load_filter_lists(filters: FiltersManager, lists: dict):
+    await filters.db._insert_many('whitelistedwords', ('word',), ((w,) for w in lists['whitelist']))
+    await filters.db._insert_many('filteredwords', ('word', 'kind'), ((fw.word, fw.kind.value) for fw in lists['filtered']))
+    await filters.db._insert_many('levenshteinwords', ('word', 'threshold', 'kind'),
+                                  ((lw.word, lw.threshold, lw.kind.value) for lw in lists['levenshtein']))
+    await filters.db._insert_many('approvedinvites', ('code', 'uses', 'alias'), lists['invites'])
+
+
+def chat(rng: random.Random, low: int = 3, high: int = 25) -> str:
+    return ' '.join(rng.choices(VOCABULARY, k=rng.randint(low, high)))
+
+
+def make_corpora(rng: random.Random, size: int, lists: dict) -> dict[str, list[str]]:
+    invites = [ai.code for ai in lists['invites']]
+    return {
+        'clean': [chat(rng) for _ in range(size)],
+        'scam': [f'{chat(rng, 2, 8)} free nitro https://{typo(rng, rng.choice(DOMAINS))}/gift/{random_word(rng, 8, 16)}'
+                 for _ in range(size)],
+        'invite': [f'{chat(rng, 0, 6)} discord.gg/{rng.choice(invites) if rng.random() < 0.3 else random_word(rng, 6, 10)}'
+                   for _ in range(size)],
+        'long': [chat(rng, 600, 700)[:4000] for _ in range(max(size // 10, 1))],
+        'unicode': [' '.join(rng.choices(UNICODE_CHUNKS + VOCABULARY, k=rng.randint(5, 40))) for _ in range(size)],
+    }
+
+
+def report(name: str, corpus: str, samples: RollingSamples, elapsed: float) -> float:
+    rate = samples.count / elapsed
+    p50, p95, p99 = samples.percentiles(50, 95, 99)
+    print(f'{name:<24} {corpus:<8} {rate:>12.0f} msg/s  p50={p50 * 1e6:8.1f}us  p95={p95 * 1e6:8.1f}us  p99={p99 * 1e6:8.1f}us')
+    return rate
+
+
+def bench_sync(name: str, corpora: dict[str, list[str]], func) -> dict[str, float]:
+    rates = {}
+    for corpus, messages in corpora.items():
+        contexts = [ScanContext(m) for m in messages]
+        samples = RollingSamples(len(contexts))
+        start = time.perf_counter()
+        for context in contexts:
+            t = time.perf_counter()
+            func(context)
+            samples.add(time.perf_counter() - t)
+        rates[corpus] = report(name, corpus, samples, time.perf_counter() - start)
+    return rates
+
+
+async def noop(*args, **kwargs):
+    pass
+
+
+class FakeChannel:
+    def __init__(self, name: str):
+        self.name = name
+        self.mention = f'#{name}'
+        self.send = noop
+
+
+def make_bot(filters: FiltersManager):
+    channels = {}
+    bot = SimpleNamespace(
+        loop=asyncio.get_running_loop(),
+        filters=filters,
+        configuration=SimpleNamespace(watch_list=[], nofilter_list=[]),
+        restrictions=SimpleNamespace(add_restriction=noop),
+        channels=mock.MagicMock(),
+        roles=mock.MagicMock(),
+        guild=mock.MagicMock(),
+        assistance_channels=(),
+        actions=[],
+        escape_text=discord.utils.escape_markdown,
+    )
+    bot.channels.__getitem__.side_effect = lambda name: channels.setdefault(name, FakeChannel(name))
+    # The scan workers never start, messages are passed to scan_message directly
+    bot.wait_until_all_ready = asyncio.Event().wait
+    return bot
+
+
+def make_message(message_id: int, content: str):
+    message = mock.MagicMock(spec=discord.Message)
+    message.id = message_id
+    message.content = message.clean_content = content
+    message.attachments = []
+    message.mentions = []
+    message.jump_url = ''
+    message.delete = noop
+    message.channel = mock.MagicMock(spec=discord.TextChannel)
+    message.channel.id = message_id % 20
+    message.channel.name = message.channel.mention = 'channel'
+    message.author = mock.MagicMock(spec=discord.Member)
+    message.author.id = message_id
+    message.author.mention = 'member'
+    message.author.send = message.author.add_roles = message.author.ban = noop
+    return message
+
+
+async def bench_scan_message(filters: FiltersManager, corpora: dict[str, list[str]]) -> dict[str, float]:
+    from cogs.events import Events
+
+    cog = Events(make_bot(filters))
+    rates = {}
+    for corpus, contents in corpora.items():
+        messages = [make_message(n, c) for n, c in enumerate(contents)]
+        # Every message is scanned, not served from the scan cache
+        filters._invalidate()
+        samples = RollingSamples(len(messages))
+        start = time.perf_counter()
+        for message in messages:
+            t = time.perf_counter()
+            await cog.scan_message(message)
+            samples.add(time.perf_counter() - t)
+        rates[corpus] = report('scan_message', corpus, samples, time.perf_counter() - start)
+    await cog.cog_unload()
+    for task in asyncio.all_tasks() - {asyncio.current_task()}:
+        task.cancel()
+    return rates
+
+
+async def run(args) -> dict[str, dict[str, float]]:
+    rng = random.Random(args.seed)
+    lists = make_filter_lists(rng, args.filtered_words, args.levenshtein_words)
+    filters = FiltersManager(SimpleNamespace(pools={}, memory_database=MemoryDatabase(), db_closed=False,
+                                             changes=SimpleNamespace(subscribe=lambda *args: None,
+                                                                     add_reload=lambda reload: None)))
+    await load_filter_lists(filters, lists)
+    await filters.setup()
+    corpora = make_corpora(rng, args.messages, lists)
+
+    print(f'{args.filtered_words} filtered words, {args.levenshtein_words} levenshtein words, '
+          f'{args.messages} messages per corpus')
+    return {
+        'match_filtered_words': bench_sync('match_filtered_words', corpora, filters.match_filtered_words),
+        'match_levenshtein_words': bench_sync('match_levenshtein_words', corpora, filters.match_levenshtein_words),
+        'search_invite': bench_sync('search_invite', corpora, filters.search_invite),
+        'scan_message': await bench_scan_message(filters, corpora),
+    }
+
+
+def check(results: dict[str, dict[str, float]], baseline: 'dict | None', tolerance: float) -> list[str]:
+    failures = []
+    for name, rates in results.items():
+        for corpus, rate in rates.items():
+            if baseline is not None:
+                expected = baseline.get(name, {}).get(corpus)
+                if expected and rate < expected * (1 - tolerance):
+                    failures.append(f'{name}/{corpus}: {rate:.0f} msg/s is more than {tolerance:.0%} under the baseline {expected:.0f} msg/s')
+                continue
+            budget = BUDGETS[name].get(corpus, BUDGETS[name]['default'])
+            if rate < budget:
+                failures.append(f'{name}/{corpus}: {rate:.0f} msg/s is under the budget {budget} msg/s')
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the message filters.')
+    parser.add_argument('--messages', type=int, default=2000, help='messages per corpus')
+    parser.add_argument('--filtered-words', type=int, default=3000)
+    parser.add_argument('--levenshtein-words', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', help='JSON file with results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown against the baseline')
+    parser.add_argument('--save-baseline', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    failures = check(results, baseline, args.tolerance)
+    for failure in failures:
+        print(f'FAIL {failure}')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
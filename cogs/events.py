@@ -3,22 +3,25 @@ from __future__ import annotations
 import asyncio
 import datetime
 import discord
-import re
-import random
+import logging
+import time
 
-from collections import deque
 from discord.ext import commands
-from string import printable
 from subprocess import call
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Optional
 from utils.checks import check_staff
-from utils.utils import send_dm_message, gen_color
+from utils.utils import send_dm_message, gen_color, delete_messages
 from utils import Restriction
-from utils.database import FilterKind
+from utils.database import FilterKind, ApprovedInvite
+from utils.filters import ScanResult
+from utils.antispam import SlidingWindow, MessageRecord
+from utils.metrics import ThroughputCounter
 
 if TYPE_CHECKING:
+    from collections.abc import Coroutine
     from kurisu import Kurisu
-    from typing import Deque
+
+logger = logging.getLogger(__name__)
 
 
 class Events(commands.Cog):
@@ -30,6 +33,30 @@ class Events(commands.Cog):
         self.bot: Kurisu = bot
         self.configuration = bot.configuration
         self.filters = self.bot.filters
+        # I hate naming variables sometimes
+        self.user_ping_antispam: SlidingWindow[MessageRecord] = SlidingWindow(self.user_ping_window)
+        self.user_message_antispam: SlidingWindow[MessageRecord] = SlidingWindow(self.user_message_window)
+        self.channel_antispam: SlidingWindow[MessageRecord] = SlidingWindow(self.channel_message_window)
+        self.sweep_task = self.bot.loop.create_task(self.sweep_antispam())
+        # Messages are split between the queues by channel so every channel is processed in order
+        self.scan_queues: 'list[asyncio.Queue[tuple[discord.Message, bool, float]]]' = [
+            asyncio.Queue(self.scan_queue_size) for _ in range(self.scan_workers)]
+        self.scan_tasks = [self.bot.loop.create_task(self.scan_worker(index)) for index in range(self.scan_workers)]
+        # Indexes of the queues that filled up, so the warning is logged once until they drain
+        self.full_queues: set[int] = set()
+        # The Discord requests of the verdicts run apart from the workers, so slow requests don't hold up the queues
+        self.action_slots = asyncio.Semaphore(self.max_running_actions)
+        self.action_tasks: set[asyncio.Task] = set()
+        self.throughput = ThroughputCounter()
+        self.report_task = self.bot.loop.create_task(self.report_scan_stats())
+
+    async def cog_unload(self):
+        self.sweep_task.cancel()
+        self.report_task.cancel()
+        for task in self.scan_tasks:
+            task.cancel()
+        for task in self.action_tasks:
+            task.cancel()
 
     ignored_file_extensions = (
         '.jpg',
@@ -42,11 +69,25 @@ class Events(commands.Cog):
         '.sed',
     )
 
-    # I hate naming variables sometimes
-    user_ping_antispam: dict[int, Deque[tuple[discord.Message, int]]] = {}
-    user_message_antispam: dict[int, list[discord.Message]] = {}
+    # Antispam limits, windows are in seconds
+    user_message_threshold = 6
+    user_message_window = 3
+    # Triggered when the mentions in the window go over this
+    user_ping_threshold = 6
+    user_ping_window = 10
+    channel_message_threshold = 22
+    channel_message_window = 5
+    antispam_sweep_interval = 60
+
+    scan_workers = 8
+    # Seconds between scan statistics log entries
+    scan_report_interval = 600
+    # Per worker
+    scan_queue_size = 250
+    # The workers wait for a slot when this many verdicts are still sending their requests
+    max_running_actions = 50
+
     userbot_yeeter: dict[int, list[discord.abc.MessageableChannel]] = {}
-    channel_antispam: dict[int, list[discord.Message]] = {}
 
     async def userbot_yeeter_pop(self, message: discord.Message):
         await asyncio.sleep(20)
@@ -57,328 +98,413 @@ class Events(commands.Cog):
         except KeyError:
             pass
 
-    async def scan_message(self, message: discord.Message, is_edit=False):
+    async def delete_message(self, message: discord.Message):
+        try:
+            await message.delete()
+        except discord.errors.NotFound:
+            pass
+
+    async def probate(self, member: discord.Member, reason: str):
+        await self.bot.restrictions.add_restriction(member, Restriction.Probation, reason=reason)
+        try:
+            await member.add_roles(self.bot.roles['Probation'])
+        except discord.NotFound:
+            # Sometimes they get banned before the bot can apply the role
+            pass
+
+    async def log_watched_message(self, message: discord.Message, is_edit: bool):
+        assert isinstance(message.channel, (discord.TextChannel, discord.VoiceChannel, discord.Thread))
+        content = f"**Channel**:\n[#{message.channel.name}]({message.jump_url})\n"
+        msg = message.author.mention
+        if message.attachments:
+            content += "**Images**:\n"
+            for c, f in enumerate(message.attachments):
+                if f.filename.lower().endswith(self.ignored_file_extensions):
+                    content += f"[[{c + 1}]]({f.url}) "
+                    if f == message.attachments[-1]:
+                        content += "\n"
+        if message.content:
+            content += "**Message**:\n"
+        embed = discord.Embed(color=gen_color(message.id), description=content + message.content)
+        if is_edit:
+            msg += " (edited)"
+        await self.bot.channels['watch-logs'].send(msg, embed=embed)
+
+    async def log_attachment(self, message: discord.Message, attachment: discord.Attachment):
+        assert isinstance(message.channel, (discord.TextChannel, discord.VoiceChannel, discord.Thread))
+        embed = discord.Embed(description=f"Size: {attachment.size}\n"
+                                          f"Message: [{message.channel.name}]({message.jump_url})\n"
+                                          f"Download: [{attachment.filename}]({attachment.url})")
+        await self.bot.channels['upload-logs'].send(f"📎 **Attachment**: {message.author.mention} "
+                                                    f"uploaded to {message.channel.mention}", embed=embed)
+
+    async def notify_filtered(self, message: discord.Message, dm_msg: str, log_msg: str, embed: discord.Embed):
+        await asyncio.gather(send_dm_message(message.author, dm_msg, embed=embed),
+                             self.bot.channels['message-logs'].send(log_msg, embed=embed))
+
+    async def update_approved_invite(self, invite: ApprovedInvite):
+        if invite.uses > 1:
+            await self.filters.update_invite_use(invite.code)
+        else:
+            await self.filters.delete_approved_invite(invite.code)
+
+    async def punish_scamming_site(self, message: discord.Message, result: ScanResult, embed: discord.Embed):
+        assert isinstance(message.author, discord.Member)
+        if message.author.id not in self.userbot_yeeter:
+            self.userbot_yeeter[message.author.id] = []
+        if message.channel not in self.userbot_yeeter[message.author.id]:
+            self.userbot_yeeter[message.author.id].append(message.channel)
+            if len(self.userbot_yeeter[message.author.id]) == 2:
+                msg = ("You have been banned from Nintendo Homebrew for linking scamming sites in multiple channels. "
+                       "If you think this is a mistake contact ❅FrozenFire❆#0700 on discord or send a email to staff@nintendohomebrew.com")
+                # The DM has to be sent before the ban or it can't be delivered
+                await send_dm_message(message.author, msg)
+                self.bot.actions.append(f'wb:{message.author.id}')
+                await message.author.ban(reason="Linking scamming links in multiple channels.", delete_message_days=0)
+                return
+            else:
+                self.bot.loop.create_task(self.userbot_yeeter_pop(message))
+        await asyncio.gather(
+            self.probate(message.author, "Linking scamming site"),
+            send_dm_message(message.author,
+                            f"Please read {self.bot.channels['welcome-and-rules'].mention}. "
+                            f"You have been probated for posting a link to a scamming site.",
+                            embed=embed),
+            self.bot.channels['message-logs'].send(
+                f"**Bad site**: {message.author.mention} mentioned a scamming site (`{result.filter_result[FilterKind.ScammingSite]}`) in {message.channel.mention} (message deleted, user probated)",
+                embed=embed),
+            self.bot.channels['mods'].send(
+                f"🔇 **Auto-probated**: {message.author.mention} probated for linking scamming site | {message.author}\n"
+                f"🗓 __Creation__: {message.author.created_at}\n"
+                f"🏷__User ID__: {message.author.id}\n"
+                f"See {self.bot.channels['message-logs'].mention} for the deleted message. @here",
+                allowed_mentions=discord.AllowedMentions(everyone=True))
+        )
+
+    async def punish_mention_spam(self, message: discord.Message):
+        assert isinstance(message.channel, (discord.TextChannel, discord.VoiceChannel, discord.Thread))
+        assert isinstance(message.author, discord.Member)
+        log_msg = f"🚫 **Auto-probate**: {message.author.mention} probated for mass user mentions | {message.author}\n" \
+                  f"🗓 __Creation__: {message.author.created_at}\n🏷 __User ID__: {message.author.id}"
+        embed = discord.Embed(title="Deleted message", color=discord.Color.gold())
+        embed.add_field(name="#" + message.channel.name, value="\u200b" + message.content)
+        await asyncio.gather(
+            self.bot.channels['mod-logs'].send(log_msg, embed=embed),
+            self.bot.channels['mods'].send(
+                f"{log_msg}\nSee {self.bot.channels['mod-logs'].mention} for the deleted message. @here",
+                allowed_mentions=discord.AllowedMentions(everyone=True)),
+            send_dm_message(
+                message.author, f"You were automatically placed under probation in {self.bot.guild.name} for mass user mentions."),
+            self.probate(message.author, "Mention spam")
+        )
+
+    def scan_verdict(self, message: discord.Message, is_edit=False) -> Optional[Coroutine[None, None, None]]:
+        """Scans a message and returns the enforcement of the result, or None if there is nothing to do."""
         # Some assumptions that should be true always
         assert isinstance(message.channel, (discord.TextChannel, discord.VoiceChannel, discord.Thread))
         assert isinstance(message.author, discord.Member)
-        random.seed(message.id)
-        embed = discord.Embed(color=gen_color(message.id))
-        embed.description = message.content
-        if message.author.id in self.configuration.watch_list:
-            content = f"**Channel**:\n[#{message.channel.name}]({message.jump_url})\n"
-            msg = message.author.mention
-            if message.attachments:
-                content += "**Images**:\n"
-                for c, f in enumerate(message.attachments):
-                    if f.filename.lower().endswith(self.ignored_file_extensions):
-                        content += f"[[{c + 1}]]({f.url}) "
-                        if f == message.attachments[-1]:
-                            content += "\n"
-            if message.content:
-                content += "**Message**:\n"
-            embed.description = content + embed.description
-            if is_edit:
-                msg += " (edited)"
-            await self.bot.channels['watch-logs'].send(msg, embed=embed)
-        msg = ''.join(char for char in message.content.lower() if char in printable)
-        msg_no_separators = re.sub(r'[ *_\-~]', '', msg)
-
-        filter_result = self.filters.match_filtered_words(msg_no_separators) | self.filters.match_levenshtein_words(message.content)
-        contains_video = any(re.findall(r'((?:https?://)?(?:www.)?)(?:(youtube\.com/watch\?v=)|(youtu\.be/))([aA-zZ_\-\d]{11})', message.content))
-        approved_invites, non_approved_invites = self.filters.search_invite(message.content)
-        contains_misinformation_url_mention = any(x in msg_no_separators for x in ('gudie.racklab', 'guide.racklab', 'gudieracklab', 'guideracklab', 'lyricly.github.io', 'lyriclygithub', 'strawpoii', 'hackinformer.com', 'console.guide', 'jacksorrell.co.uk', 'jacksorrell.tv', 'nintendobrew.com', 'reinx.guide', 'NxpeNwz', 'scenefolks.com', 'rentry.co'))
-        contains_invite_link = approved_invites or non_approved_invites
+        result = self.filters.scan(message.content)
+        # check for mention spam
+        mention_spam = len(message.mentions) >= 6
+        watched = message.author.id in self.configuration.watch_list
+        if result.clean and not mention_spam and not watched and not message.attachments:
+            return None
+        return self.enforce(message, result, mention_spam=mention_spam, watched=watched, is_edit=is_edit)
+
+    async def scan_message(self, message: discord.Message, is_edit=False):
+        enforcement = self.scan_verdict(message, is_edit=is_edit)
+        if enforcement is not None:
+            await enforcement
+
+    async def enforce(self, message: discord.Message, result: ScanResult, *, mention_spam: bool, watched: bool, is_edit: bool):
+        """Carries out the actions for a scanned message.
+
+        Every action runs concurrently, actions that depend on each other are awaited in order inside their own coroutine."""
+        assert isinstance(message.channel, (discord.TextChannel, discord.VoiceChannel, discord.Thread))
+        assert isinstance(message.author, discord.Member)
+        filter_result = result.filter_result
+        actions = []
+        delete = False
+        embed = discord.Embed(color=gen_color(message.id), description=message.content)
+        rules_mention = self.bot.channels['welcome-and-rules'].mention
+
+        if watched:
+            actions.append(self.log_watched_message(message, is_edit))
 
         for f in message.attachments:
             if not f.filename.lower().endswith(self.ignored_file_extensions):
-                embed2 = discord.Embed(description=f"Size: {f.size}\n"
-                                                   f"Message: [{message.channel.name}]({message.jump_url})\n"
-                                                   f"Download: [{f.filename}]({f.url})")
-                await self.bot.channels['upload-logs'].send(f"📎 **Attachment**: {message.author.mention} "
-                                                            f"uploaded to {message.channel.mention}", embed=embed2)
-        if contains_invite_link:
-            await self.bot.channels['message-logs'].send(
+                actions.append(self.log_attachment(message, f))
+
+        if result.approved_invites or result.non_approved_invites:
+            actions.append(self.bot.channels['message-logs'].send(
                 f"✉️ **Invite posted**: {message.author.mention} posted an invite link in {message.channel.mention}"
-                f" {'(message deleted)' if non_approved_invites else ''}"
+                f" {'(message deleted)' if result.non_approved_invites else ''}"
                 f"\n------------------\n"
-                f"{self.bot.escape_text(message.content)}")
-            if non_approved_invites:
-                try:
-                    await message.delete()
-                except discord.NotFound:
-                    pass
-                try:
-                    await message.author.send(
-                        f"Please read {self.bot.channels['welcome-and-rules'].mention}. "
-                        f"Server invites must be approved by staff. To contact staff send a message to <@333857992170536961>.")
-                except discord.errors.Forbidden:
-                    pass
-            for invite in approved_invites:
+                f"{self.bot.escape_text(message.content)}"))
+            if result.non_approved_invites:
+                delete = True
+                actions.append(send_dm_message(
+                    message.author,
+                    f"Please read {rules_mention}. "
+                    f"Server invites must be approved by staff. To contact staff send a message to <@333857992170536961>."))
+            for invite in result.approved_invites:
                 if invite.uses != -1:
-                    if invite.uses > 1:
-                        await self.filters.update_invite_use(invite.code)
-                    else:
-                        await self.filters.delete_approved_invite(invite.code)
+                    actions.append(self.update_approved_invite(invite))
 
-        if contains_misinformation_url_mention:
-            try:
-                await message.delete()
-            except discord.errors.NotFound:
-                pass
-            await send_dm_message(message.author,
-                                  f"Please read {self.bot.channels['welcome-and-rules'].mention}. "
-                                  f"This site may be misinterpreted as legitimate and cause users harm, therefore your message was automatically deleted.",
-                                  embed=embed)
-            await self.bot.channels['message-logs'].send(
+        if result.contains_misinformation_url:
+            delete = True
+            actions.append(self.notify_filtered(
+                message,
+                f"Please read {rules_mention}. "
+                f"This site may be misinterpreted as legitimate and cause users harm, therefore your message was automatically deleted.",
                 f"**Bad site**: {message.author.mention} mentioned a blocked site in {message.channel.mention} (message deleted)",
-                embed=embed)
+                embed))
 
         if FilterKind.PiracyTool in filter_result:
-            embed.description = message.content
-            try:
-                await message.delete()
-            except discord.errors.NotFound:
-                pass
-            await send_dm_message(message.author,
-                                  f"Please read {self.bot.channels['welcome-and-rules'].mention}. "
-                                  f"You cannot mention tools used for piracy directly or indirectly, "
-                                  f"therefore your message was automatically deleted.",
-                                  embed=embed)
-            await self.bot.channels['message-logs'].send(
+            delete = True
+            actions.append(self.notify_filtered(
+                message,
+                f"Please read {rules_mention}. "
+                f"You cannot mention tools used for piracy directly or indirectly, "
+                f"therefore your message was automatically deleted.",
                 f"**Bad tool**: {message.author.mention} mentioned a piracy tool (`{filter_result[FilterKind.PiracyTool]}`) in {message.channel.mention} (message deleted)",
-                embed=embed)
+                embed))
 
         if FilterKind.PiracyVideo in filter_result:
-            try:
-                await message.delete()
-            except discord.errors.NotFound:
-                pass
-            await send_dm_message(message.author,
-                                  f"Please read {self.bot.channels['welcome-and-rules'].mention}. "
-                                  f"You cannot link videos that mention piracy, therefore your message was automatically deleted.",
-                                  embed=embed)
-            await self.bot.channels['message-logs'].send(
+            delete = True
+            actions.append(self.notify_filtered(
+                message,
+                f"Please read {rules_mention}. "
+                f"You cannot link videos that mention piracy, therefore your message was automatically deleted.",
                 f"**Bad video**: {message.author.mention} linked a banned video (`{filter_result[FilterKind.PiracyVideo]}`) in {message.channel.mention} (message deleted)",
-                embed=embed)
+                embed))
 
         if FilterKind.PiracyToolAlert in filter_result:
-            embed.description = message.content
-            await self.bot.channels['message-logs'].send(
+            actions.append(self.bot.channels['message-logs'].send(
                 f"**Bad tool**: {message.author.mention} likely mentioned a piracy tool (`{filter_result[FilterKind.PiracyToolAlert]}`) in {message.channel.mention}",
-                embed=embed)
+                embed=embed))
 
         if FilterKind.PiracySite in filter_result:
-            embed.description = message.content
-            try:
-                await message.delete()
-            except discord.errors.NotFound:
-                pass
-            await send_dm_message(message.author,
-                                  f"Please read {self.bot.channels['welcome-and-rules'].mention}. "
-                                  f"You cannot mention sites used for piracy directly or indirectly, "
-                                  f"therefore your message was automatically deleted.",
-                                  embed=embed)
-            await self.bot.channels['message-logs'].send(
+            delete = True
+            actions.append(self.notify_filtered(
+                message,
+                f"Please read {rules_mention}. "
+                f"You cannot mention sites used for piracy directly or indirectly, "
+                f"therefore your message was automatically deleted.",
                 f"**Bad site**: {message.author.mention} mentioned a piracy site directly (`{filter_result[FilterKind.PiracySite]}`) in {message.channel.mention} (message deleted)",
-                embed=embed)
+                embed))
 
         if FilterKind.UnbanningTool in filter_result:
-            embed.description = message.content
-            try:
-                await message.delete()
-            except discord.errors.NotFound:
-                pass
-            await send_dm_message(message.author,
-                                  f"Please read {self.bot.channels['welcome-and-rules'].mention}. "
-                                  f"You cannot mention sites, programs or services used for unbanning, therefore your message was automatically deleted.",
-                                  embed=embed)
-            await self.bot.channels['message-logs'].send(
+            delete = True
+            actions.append(self.notify_filtered(
+                message,
+                f"Please read {rules_mention}. "
+                f"You cannot mention sites, programs or services used for unbanning, therefore your message was automatically deleted.",
                 f"**Bad site**: {message.author.mention} mentioned an unbanning site/service/program directly (`{filter_result[FilterKind.UnbanningTool]}`) in {message.channel.mention} (message deleted)",
-                embed=embed)
+                embed))
 
-        if contains_video and message.channel in self.bot.assistance_channels:
-            await self.bot.channels['message-logs'].send(
-                f"▶️ **Video posted**: {message.author.mention} posted a video in {message.channel.mention}\n------------------\n{message.clean_content}")
+        if result.contains_video and message.channel in self.bot.assistance_channels:
+            actions.append(self.bot.channels['message-logs'].send(
+                f"▶️ **Video posted**: {message.author.mention} posted a video in {message.channel.mention}\n------------------\n{message.clean_content}"))
 
         if FilterKind.ScammingSite in filter_result:
-            embed.description = message.content
+            delete = True
+            actions.append(self.punish_scamming_site(message, result, embed))
 
-            try:
-                await message.delete()
-            except discord.errors.NotFound:
-                pass
-
-            if message.author.id not in self.userbot_yeeter:
-                self.userbot_yeeter[message.author.id] = []
-            if message.channel not in self.userbot_yeeter[message.author.id]:
-                self.userbot_yeeter[message.author.id].append(message.channel)
-                if len(self.userbot_yeeter[message.author.id]) == 2:
-                    msg = ("You have been banned from Nintendo Homebrew for linking scamming sites in multiple channels. "
-                           "If you think this is a mistake contact ❅FrozenFire❆#0700 on discord or send a email to staff@nintendohomebrew.com")
-                    await send_dm_message(message.author, msg)
-                    self.bot.actions.append(f'wb:{message.author.id}')
-                    await message.author.ban(reason="Linking scamming links in multiple channels.", delete_message_days=0)
-                    try:
-                        await message.delete()
-                    except discord.errors.NotFound:
-                        pass
-                    return
-                else:
-                    self.bot.loop.create_task(self.userbot_yeeter_pop(message))
-            await self.bot.restrictions.add_restriction(message.author, Restriction.Probation, reason="Linking scamming site")
-            try:
-                await message.author.add_roles(self.bot.roles['Probation'])
-            except discord.NotFound:
-                # Sometimes they get banned before the bot can apply the role
-                pass
-            await send_dm_message(message.author,
-                                  f"Please read {self.bot.channels['welcome-and-rules'].mention}. "
-                                  f"You have been probated for posting a link to a scamming site.",
-                                  embed=embed)
-            await self.bot.channels['message-logs'].send(
-                f"**Bad site**: {message.author.mention} mentioned a scamming site (`{filter_result[FilterKind.ScammingSite]}`) in {message.channel.mention} (message deleted, user probated)",
-                embed=embed)
-            await self.bot.channels['mods'].send(
-                f"🔇 **Auto-probated**: {message.author.mention} probated for linking scamming site | {message.author}\n"
-                f"🗓 __Creation__: {message.author.created_at}\n"
-                f"🏷__User ID__: {message.author.id}\n"
-                f"See {self.bot.channels['message-logs'].mention} for the deleted message. @here",
-                allowed_mentions=discord.AllowedMentions(everyone=True))
+        if mention_spam:
+            delete = True
+            actions.append(self.punish_mention_spam(message))
 
-        # check for mention spam
-        if len(message.mentions) >= 6:
-            log_msg = f"🚫 **Auto-probate**: {message.author.mention} probated for mass user mentions | {message.author}\n" \
-                      f"🗓 __Creation__: {message.author.created_at}\n🏷 __User ID__: {message.author.id}"
-            embed = discord.Embed(title="Deleted message", color=discord.Color.gold())
-            embed.add_field(name="#" + message.channel.name, value="\u200b" + message.content)
-            await self.bot.channels['mod-logs'].send(log_msg, embed=embed)
-            await self.bot.channels['mods'].send(
-                f"{log_msg}\nSee {self.bot.channels['mod-logs'].mention} for the deleted message. @here",
-                allowed_mentions=discord.AllowedMentions(everyone=True))
-            try:
-                await message.delete()
-            except discord.errors.NotFound:
-                pass
-            await send_dm_message(
-                message.author, f"You were automatically placed under probation in {self.bot.guild.name} for mass user mentions.")
-            await self.bot.restrictions.add_restriction(message.author, Restriction.Probation, reason="Mention spam")
-            await message.author.add_roles(self.bot.roles['Probation'])
-
-    async def user_spam_check(self, message: discord.Message):
+        if delete:
+            # Deleting goes first so it's the first request sent
+            actions.insert(0, self.delete_message(message))
+
+        start = time.perf_counter()
+        await asyncio.gather(*actions)
+        self.filters.timings.record('enforcement', time.perf_counter() - start)
+
+    def record_channel_name(self, record: MessageRecord) -> str:
+        channel = self.bot.guild.get_channel_or_thread(record.channel_id)
+        return f"#{channel.name}" if channel else f"#{record.channel_id}"
+
+    async def delete_records(self, records: list[MessageRecord]) -> int:
+        deleted = await delete_messages(self.bot, ((record.channel_id, record.id) for record in records))
+        logger.info("Deleted %d/%d messages caught by the antispam", deleted, len(records))
+        return deleted
+
+    def user_spam_check(self, message: discord.Message) -> Optional[Coroutine[None, None, None]]:
         assert isinstance(message.author, discord.Member)
         assert isinstance(message.channel, discord.abc.GuildChannel)
-        if message.author.id not in self.user_message_antispam:
-            self.user_message_antispam[message.author.id] = []
-        self.user_message_antispam[message.author.id].append(message)
+        count = self.user_message_antispam.add(message.author.id, MessageRecord.from_message(message),
+                                               timestamp=message.created_at.timestamp())
         # it can trigger it multiple times if I use >. it can't skip to a number so this should work
-        if len(self.user_message_antispam[message.author.id]) == 6:
-            try:
-                await message.author.timeout(datetime.timedelta(days=2))
-            except discord.Forbidden:
-                # If the bot can't timeout the member it's quite likely they shouldn't be timed out for this anyway
-                return
-            msg_user = "You were automatically timed-out for sending too many messages in a short period of time!\n\n" \
-                       "If you believe this was done in error, send a direct message (DM) to <@!333857992170536961> to contact staff."
-            await send_dm_message(message.author, msg_user)
-            log_msg = f"🔇 **Auto-timeout**: {message.author.mention} timed out for spamming | {message.author}\n🗓 __Creation__: {message.author.created_at}\n🏷 __User ID__: {message.author.id}"
-            embed = discord.Embed(title="Deleted messages", color=discord.Color.gold())
-            # clone list so nothing is removed while going through it
-            msgs_to_delete = self.user_message_antispam[message.author.id][:]
-            for msg in msgs_to_delete:
-                assert isinstance(msg.channel, discord.abc.GuildChannel)
-                embed.add_field(name="#" + msg.channel.name,
-                                value="\u200b" + msg.content)  # added zero-width char to prevent an error with an empty string (lazy workaround)
-            await self.bot.channels['mod-logs'].send(log_msg, embed=embed)
-            await self.bot.channels['mods'].send(
-                f"{log_msg}\nSee {self.bot.channels['mod-logs'].mention} for a list of deleted messages.")
-            for msg in msgs_to_delete:
-                try:
-                    await msg.delete()
-                except discord.errors.NotFound:
-                    pass  # don't fail if the message doesn't exist
-        await asyncio.sleep(3)
-        self.user_message_antispam[message.author.id].remove(message)
+        if count == self.user_message_threshold:
+            return self.timeout_spammer(message)
+        return None
+
+    async def timeout_spammer(self, message: discord.Message):
+        assert isinstance(message.author, discord.Member)
         try:
-            if len(self.user_message_antispam[message.author.id]) == 0:
-                self.user_message_antispam.pop(message.author.id)
-        except KeyError:
-            pass  # if the array doesn't exist, don't raise an error
+            await message.author.timeout(datetime.timedelta(days=2))
+        except discord.Forbidden:
+            # If the bot can't timeout the member it's quite likely they shouldn't be timed out for this anyway
+            return
+        msg_user = "You were automatically timed-out for sending too many messages in a short period of time!\n\n" \
+                   "If you believe this was done in error, send a direct message (DM) to <@!333857992170536961> to contact staff."
+        await send_dm_message(message.author, msg_user)
+        log_msg = f"🔇 **Auto-timeout**: {message.author.mention} timed out for spamming | {message.author}\n🗓 __Creation__: {message.author.created_at}\n🏷 __User ID__: {message.author.id}"
+        embed = discord.Embed(title="Deleted messages", color=discord.Color.gold())
+        msgs_to_delete = self.user_message_antispam.items(message.author.id)
+        for msg in msgs_to_delete:
+            embed.add_field(name=self.record_channel_name(msg),
+                            value="\u200b" + msg.preview)  # added zero-width char to prevent an error with an empty string (lazy workaround)
+        deleted = await self.delete_records(msgs_to_delete)
+        embed.title = f"Deleted messages ({deleted})"
+        await self.bot.channels['mod-logs'].send(log_msg, embed=embed)
+        await self.bot.channels['mods'].send(
+            f"{log_msg}\nSee {self.bot.channels['mod-logs'].mention} for a list of deleted messages.")
 
-    async def user_ping_check(self, message: discord.Message):
+    def user_ping_check(self, message: discord.Message) -> Optional[Coroutine[None, None, None]]:
         assert isinstance(message.author, discord.Member)
         key = message.author.id
-        if key not in self.user_ping_antispam:
-            self.user_ping_antispam[key] = deque()
-        self.user_ping_antispam[key].append((message, len(message.mentions)))
-        user_mentions: tuple[int]
-        _, user_mentions = zip(*self.user_ping_antispam[key])  # type: ignore # type checker can't infer correct type
-        if sum(user_mentions) > 6:
-            await self.bot.restrictions.add_restriction(message.author, Restriction.Probation, reason="User ping check")
-            msg_user = ("You were automatically placed under probation "
-                        "for mentioning too many users in a short period of time!\n\n"
-                        "If you believe this was done in error, send a direct "
-                        "message (DM) to <@!333857992170536961> to contact staff.")
-            await send_dm_message(message.author, msg_user)
-            log_msg = f"🚫 **Auto-probated**: {message.author.mention} probated for mass user mentions | {message.author}\n" \
-                      f"🗓 __Creation__: {message.author.created_at}\n🏷 __User ID__: {message.author.id}"
-            embed = discord.Embed(title="Deleted messages", color=discord.Color.gold())
-            # clone list so nothing is removed while going through it
-            msgs_to_delete = self.user_ping_antispam[key].copy()
-            for msg in msgs_to_delete:
-                assert isinstance(msg[0].channel, discord.abc.GuildChannel)
-                # added zero-width char to prevent an error with an empty string (lazy workaround)
-                embed.add_field(name="#" + msg[0].channel.name, value="\u200b" + msg[0].content)
-            await self.bot.channels['mod-logs'].send(log_msg, embed=embed)
-            await self.bot.channels['mods'].send(
-                f"{log_msg}\nSee {self.bot.channels['mod-logs'].mention} for a list of deleted messages. @here",
-                allowed_mentions=discord.AllowedMentions(everyone=True))
-            for msg in msgs_to_delete:
-                try:
-                    await msg[0].delete()
-                except discord.errors.NotFound:
-                    pass  # don't fail if the message doesn't exist
-            self.user_ping_antispam[key].clear()
-        else:
-            await asyncio.sleep(10)
-            self.user_ping_antispam[key].popleft()
-        try:
-            if len(self.user_ping_antispam[key]) == 0:
-                self.user_ping_antispam.pop(key)
-        except KeyError:
-            pass  # if the array doesn't exist, don't raise an error
+        record = MessageRecord.from_message(message)
+        user_mentions = self.user_ping_antispam.add(key, record, weight=record.mentions,
+                                                    timestamp=message.created_at.timestamp())
+        if user_mentions > self.user_ping_threshold:
+            msgs_to_delete = self.user_ping_antispam.items(key)
+            # Start counting again so it isn't triggered again by the same messages
+            self.user_ping_antispam.clear(key)
+            return self.probate_mass_pinger(message, msgs_to_delete)
+        return None
 
-    async def channel_spam_check(self, message: discord.Message):
+    async def probate_mass_pinger(self, message: discord.Message, msgs_to_delete: list[MessageRecord]):
+        assert isinstance(message.author, discord.Member)
+        await self.bot.restrictions.add_restriction(message.author, Restriction.Probation, reason="User ping check")
+        msg_user = ("You were automatically placed under probation "
+                    "for mentioning too many users in a short period of time!\n\n"
+                    "If you believe this was done in error, send a direct "
+                    "message (DM) to <@!333857992170536961> to contact staff.")
+        await send_dm_message(message.author, msg_user)
+        log_msg = f"🚫 **Auto-probated**: {message.author.mention} probated for mass user mentions | {message.author}\n" \
+                  f"🗓 __Creation__: {message.author.created_at}\n🏷 __User ID__: {message.author.id}"
+        embed = discord.Embed(title="Deleted messages", color=discord.Color.gold())
+        for msg in msgs_to_delete:
+            # added zero-width char to prevent an error with an empty string (lazy workaround)
+            embed.add_field(name=self.record_channel_name(msg), value="\u200b" + msg.preview)
+        deleted = await self.delete_records(msgs_to_delete)
+        embed.title = f"Deleted messages ({deleted})"
+        await self.bot.channels['mod-logs'].send(log_msg, embed=embed)
+        await self.bot.channels['mods'].send(
+            f"{log_msg}\nSee {self.bot.channels['mod-logs'].mention} for a list of deleted messages. @here",
+            allowed_mentions=discord.AllowedMentions(everyone=True))
+
+    def channel_spam_check(self, message: discord.Message) -> Optional[Coroutine[None, None, None]]:
         assert isinstance(message.channel, discord.abc.GuildChannel)
-        if message.channel.id not in self.channel_antispam:
-            self.channel_antispam[message.channel.id] = []
-        self.channel_antispam[message.channel.id].append(message)
+        count = self.channel_antispam.add(message.channel.id, MessageRecord.from_message(message),
+                                          timestamp=message.created_at.timestamp())
         # it can trigger it multiple times if I use >. it can't skip to a number so this should work
-        if len(self.channel_antispam[message.channel.id]) == 22:
-            if isinstance(message.channel, (discord.VoiceChannel, discord.TextChannel)):
-                await message.channel.set_permissions(self.bot.guild.default_role, send_messages=False)
-                msg_channel = "This channel has been automatically locked for spam. Please wait while staff review the situation."
-                await message.channel.send(msg_channel)
-            embed = discord.Embed(title="Deleted messages", color=discord.Color.gold())
-            # msgs_to_delete = self.channel_antispam[message.author.id][:]  # clone list so nothing is removed while going through it
-            # for msg in msgs_to_delete:
-            #     embed.add_field(name="@"+self.bot.help_command.remove_mentions(msg.author), value="\u200b" + msg.content)  # added zero-width char to prevent an error with an empty string (lazy workaround)
-            log_msg = f"🔒 **Auto-locked**: {message.channel.mention} locked for spam"
-            await self.bot.channels['mod-logs'].send(log_msg, embed=embed)
-            await self.bot.channels['mods'].send(f"{log_msg} @here\nSee {self.bot.channels['mod-logs'].mention} for a list of deleted messages.",
-                                                 allowed_mentions=discord.AllowedMentions(everyone=True))
-            msgs_to_delete = self.channel_antispam[message.channel.id][:]  # clone list so nothing is removed while going through it
-            for msg in msgs_to_delete:
-                try:
-                    await msg.delete()
-                except discord.errors.NotFound:
-                    pass  # don't fail if the message doesn't exist
-        await asyncio.sleep(5)
-        self.channel_antispam[message.channel.id].remove(message)
+        if count == self.channel_message_threshold:
+            return self.lock_spammed_channel(message)
+        return None
+
+    async def lock_spammed_channel(self, message: discord.Message):
+        assert isinstance(message.channel, discord.abc.GuildChannel)
+        if isinstance(message.channel, (discord.VoiceChannel, discord.TextChannel)):
+            await message.channel.set_permissions(self.bot.guild.default_role, send_messages=False)
+            msg_channel = "This channel has been automatically locked for spam. Please wait while staff review the situation."
+            await message.channel.send(msg_channel)
+        deleted = await self.delete_records(self.channel_antispam.items(message.channel.id))
+        embed = discord.Embed(title=f"Deleted messages ({deleted})", color=discord.Color.gold())
+        # msgs_to_delete = self.channel_antispam[message.author.id][:]  # clone list so nothing is removed while going through it
+        # for msg in msgs_to_delete:
+        #     embed.add_field(name="@"+self.bot.help_command.remove_mentions(msg.author), value="\u200b" + msg.content)  # added zero-width char to prevent an error with an empty string (lazy workaround)
+        log_msg = f"🔒 **Auto-locked**: {message.channel.mention} locked for spam"
+        await self.bot.channels['mod-logs'].send(log_msg, embed=embed)
+        await self.bot.channels['mods'].send(f"{log_msg} @here\nSee {self.bot.channels['mod-logs'].mention} for a list of deleted messages.",
+                                             allowed_mentions=discord.AllowedMentions(everyone=True))
+
+    async def sweep_antispam(self):
+        """Drops the antispam entries of users and channels that stopped sending messages."""
+        while True:
+            await asyncio.sleep(self.antispam_sweep_interval)
+            for window in (self.user_message_antispam, self.user_ping_antispam, self.channel_antispam):
+                window.sweep()
+
+    async def scan_worker(self, index: int):
+        """Processes the messages of the channels assigned to a queue, in the order they arrived."""
+        queue = self.scan_queues[index]
+        await self.bot.wait_until_all_ready()
+        while True:
+            message, is_edit, enqueued = await queue.get()
+            try:
+                await self.process_message(message, is_edit)
+            except Exception:
+                await self.report_error('on_message_edit' if is_edit else 'on_message')
+            finally:
+                queue.task_done()
+                self.filters.timings.record('total', time.perf_counter() - enqueued)
+                self.throughput.add()
+                if index in self.full_queues and queue.empty():
+                    self.full_queues.discard(index)
+                    logger.info("Scan queue %d caught up", index)
+
+    async def process_message(self, message: discord.Message, is_edit: bool):
+        """Scans a message and updates the antispam windows, the requests they result in are dispatched."""
+        assert message.guild is not None
+        if message.author == message.guild.me or check_staff(self.bot, 'Helper', message.author.id) \
+                or message.channel.id in self.bot.configuration.nofilter_list:
+            return
+        event = 'on_message_edit' if is_edit else 'on_message'
+        actions = [self.scan_verdict(message, is_edit=is_edit)]
+        if not is_edit:
+            actions += [self.user_ping_check(message), self.user_spam_check(message), self.channel_spam_check(message)]
+        for action in actions:
+            if action is not None:
+                await self.dispatch(action, event)
+
+    async def dispatch(self, action: Coroutine[None, None, None], event: str):
+        """Runs an action in the background, waiting for a slot if too many are running."""
+        await self.action_slots.acquire()
+        task = self.bot.loop.create_task(self.run_action(action, event))
+        self.action_tasks.add(task)
+        task.add_done_callback(self.action_done)
+
+    async def run_action(self, action: Coroutine[None, None, None], event: str):
         try:
-            if len(self.channel_antispam[message.channel.id]) == 0:
-                self.channel_antispam.pop(message.channel.id)
-        except KeyError:
-            pass  # if the array doesn't exist, don't raise an error
+            await action
+        except Exception:
+            await self.report_error(event)
+
+    async def report_error(self, event: str):
+        """Reports the exception being handled through on_error, so a failure there can't stop a worker."""
+        try:
+            await self.bot.on_error(event)
+        except Exception:
+            # The original exception is chained to this one
+            logger.exception("on_error failed while reporting an exception in %s", event)
+
+    def action_done(self, task: asyncio.Task):
+        self.action_tasks.discard(task)
+        self.action_slots.release()
+
+    async def enqueue_message(self, message: discord.Message, is_edit: bool = False):
+        index = message.channel.id % len(self.scan_queues)
+        queue = self.scan_queues[index]
+        if queue.full() and index not in self.full_queues:
+            self.full_queues.add(index)
+            logger.warning("Scan queue %d is full, %d messages are waiting", index, self.queue_depth)
+        # Waits while the queue is full so a raid backs up here instead of spawning more work
+        await queue.put((message, is_edit, time.perf_counter()))
+
+    async def report_scan_stats(self):
+        while True:
+            await asyncio.sleep(self.scan_report_interval)
+            logger.info("Scanned %.2f messages/s, %d messages queued\n%s",
+                        self.throughput.rate(), self.queue_depth, self.filters.timings.format())
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(q.qsize() for q in self.scan_queues)
 
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
@@ -392,26 +518,15 @@ class Events(commands.Cog):
                     await self.bot.channels['helpers'].send("Restarting bot...")
                     await self.bot.close()
                 return
-        await self.bot.wait_until_all_ready()
-        if message.author == message.guild.me or check_staff(self.bot, 'Helper', message.author.id) \
-                or message.channel.id in self.bot.configuration.nofilter_list:
-            return
-        await self.scan_message(message)
-        self.bot.loop.create_task(self.user_ping_check(message))
-        self.bot.loop.create_task(self.user_spam_check(message))
-        self.bot.loop.create_task(self.channel_spam_check(message))
+        await self.enqueue_message(message)
 
     @commands.Cog.listener()
     async def on_message_edit(self, message_before: discord.Message, message_after: discord.Message):
         if message_after.guild is None or message_after.author.bot:
             return
-        await self.bot.wait_until_all_ready()
-        if message_after.author == message_after.guild.me or check_staff(self.bot, 'Helper', message_after.author.id) \
-                or message_after.channel.id in self.bot.configuration.nofilter_list:
-            return
         if message_before.content == message_after.content:
             return
-        await self.scan_message(message_after, is_edit=True)
+        await self.enqueue_message(message_after, is_edit=True)
 
 
 async def setup(bot):
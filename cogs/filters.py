@@ -1,14 +1,13 @@
 from __future__ import annotations
 
 import discord
-import re
 
 from discord.ext import commands
 from textwrap import wrap
 from typing import TYPE_CHECKING
-from Levenshtein import distance
 from utils.checks import is_staff
 from utils.database import FilterKind
+from utils.filters import ScanContext
 
 if TYPE_CHECKING:
     from kurisu import Kurisu
@@ -148,18 +147,10 @@ class Filter(commands.Cog):
         """Test a message against the levenshtein filter"""
 
         matches = {}
-        message = message[::-1]
-        to_check = re.findall(r"([\w0-9-]+\.[\w0-9-]+)", message)
-
-        for word in to_check:
-            word = word[::-1]
+        for word in ScanContext(message).domains:
             if word in self.filters.whitelist:
                 continue
-            matches[word] = []
-            for lsh_word in self.filters.lsh_words:
-                word_distance = distance(word, lsh_word.word)
-                if word_distance < lsh_word.threshold:
-                    matches[word].append(lsh_word.word)
+            matches[word] = [lsh_word.word for lsh_word in self.filters.match_levenshtein_word(word)]
         if matches:
             embed = discord.Embed(title="Matches")
             for match in matches.keys():
@@ -268,6 +259,25 @@ class Filter(commands.Cog):
         else:
             await ctx.send("The invite filter is empty!")
 
+    @is_staff("Helper")
+    @commands.command(name='filterstats')
+    async def filter_stats(self, ctx: KurisuContext):
+        """Shows the message scan statistics"""
+        filters = self.filters
+        embed = discord.Embed(title="Scan statistics")
+        embed.add_field(name="Scan cache",
+                        value=f"{filters.scan_cache_entries}/{filters.scan_cache_size} entries\n"
+                              f"{filters.scan_cache_hits} hits, {filters.scan_cache_misses} misses "
+                              f"({filters.scan_cache_hit_rate:.1%} hit rate)\n"
+                              f"Filter list version {filters.version}", inline=False)
+        if events := self.bot.get_cog('Events'):
+            embed.add_field(name="Scan queue",
+                            value=f"{events.queue_depth} messages waiting\n"
+                                  f"{events.throughput.rate():.2f} messages/s over the last {events.throughput.window}s\n"
+                                  f"{events.throughput.total} messages processed", inline=False)
+        embed.add_field(name="Stage timings", value=f"```\n{filters.timings.format()}\n```", inline=False)
+        await ctx.send(embed=embed)
+
     # @commands.command(name='checkcollision', aliases=['filtercollision'])
     # async def check_filter_collision(self, ctx: KurisuContext):
     #     """Detects collisions between the levenshtein filter and the word filter,
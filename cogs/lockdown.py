@@ -30,54 +30,61 @@ class Lockdown(commands.Cog):
                                 level: int, message: Optional[str] = None) -> list[discord.TextChannel]:
 
         locked_down = []
-        to_add = []
+        changes = {}
 
         reason = f"Level {level} lockdown"
 
-        for c in channels:
+        db_channels = await self.configuration.get_channels_by_id([c.id for c in channels])
+        missing = [(c.name, c) for c in channels if c.id not in db_channels]
+        if missing:
+            await self.configuration.add_channels(missing)
 
-            db_channel = await self.configuration.get_channel(c.id)
+        try:
+            for c in channels:
 
-            if not db_channel:
-                await self.configuration.add_channel(c.name, c)
-                db_channel = await self.configuration.get_channel(c.id)
+                db_channel = db_channels.get(c.id)
 
-            if db_channel and db_channel.lock_level > 0:
-                await ctx.send(f"🔒 {c.mention} is already locked down. Use `.unlock` to unlock.")
-                continue
+                if db_channel and db_channel.lock_level > 0:
+                    await ctx.send(f"🔒 {c.mention} is already locked down. Use `.unlock` to unlock.")
+                    continue
 
-            channel_overwrites = c.overwrites
+                channel_overwrites = c.overwrites
+                to_add = []
 
-            for target, overwrites in channel_overwrites.items():
+                for target, overwrites in channel_overwrites.items():
 
-                # Bot roles and member overwrites are spared
-                if isinstance(target, discord.Object) or isinstance(target, discord.Member) or target.is_bot_managed():
-                    continue
+                    # Bot roles and member overwrites are spared
+                    if isinstance(target, discord.Object) or isinstance(target, discord.Member) or target.is_bot_managed():
+                        continue
 
-                # Only change the send_messages permission for roles that have it set to True and a lower in hierarchy
-                # or is the everyone role
-                if target is ctx.guild.default_role and overwrites.send_messages is not False \
-                        or target < top_role and overwrites.send_messages is True:
-                    value = overwrites.send_messages
-                    channel_overwrites[target].send_messages = False
-                    to_add.append((target.id, value))
+                    # Only change the send_messages permission for roles that have it set to True and a lower in hierarchy
+                    # or is the everyone role
+                    if target is ctx.guild.default_role and overwrites.send_messages is not False \
+                            or target < top_role and overwrites.send_messages is True:
+                        value = overwrites.send_messages
+                        channel_overwrites[target].send_messages = False
+                        to_add.append((target.id, value))
 
-            if not to_add:
-                await ctx.send(f"No changes done to {c.mention}")
-                continue
+                if not to_add:
+                    await ctx.send(f"No changes done to {c.mention}")
+                    continue
 
-            try:
-                await c.edit(overwrites=channel_overwrites, reason=reason)
-            except discord.Forbidden:
-                await ctx.send(f"Failed to lock down {c}")
-                continue
+                try:
+                    await c.edit(overwrites=channel_overwrites, reason=reason)
+                except discord.Forbidden:
+                    await ctx.send(f"Failed to lock down {c}")
+                    continue
 
-            await self.configuration.add_changed_roles(to_add, c)
-            await self.configuration.set_channel_lock_level(c, lock_level=level)
-            locked_down.append(c)
+                changes[c] = to_add
+                locked_down.append(c)
 
-            if message:
-                await c.send(message)
+                if message:
+                    await c.send(message)
+        finally:
+            # The channels locked down so far are saved even if a later channel fails
+            if changes and not await self.configuration.lock_channels(changes, lock_level=level):
+                await ctx.send(f"⚠️ Failed to save the lockdown of {', '.join(c.mention for c in changes)}, "
+                               f"their permissions will have to be restored manually.")
 
         return locked_down
 
@@ -186,34 +193,40 @@ class Lockdown(commands.Cog):
 
         unlocked = []
 
-        for c in channels:
+        db_channels = await self.configuration.get_channels_by_id([c.id for c in channels])
+        changed_roles = await self.configuration.get_changed_roles_many(channels)
 
-            db_channel = await self.configuration.get_channel(c.id)
+        try:
+            for c in channels:
 
-            if not db_channel or db_channel.lock_level == 0:
-                await ctx.send(f"{c.mention} is not locked.")
-                continue
-            elif db_channel.lock_level == 3 and not check_staff(self.bot, "Owner", author.id):
-                await ctx.send(f"{c.mention} can only be unlocked by a Owner.")
-                continue
+                db_channel = db_channels.get(c.id)
 
-            channel_overwrites = c.overwrites
+                if not db_channel or db_channel.lock_level == 0:
+                    await ctx.send(f"{c.mention} is not locked.")
+                    continue
+                elif db_channel.lock_level == 3 and not check_staff(self.bot, "Owner", author.id):
+                    await ctx.send(f"{c.mention} can only be unlocked by a Owner.")
+                    continue
 
-            async for changed_role in self.configuration.get_changed_roles(c):
-                role = ctx.guild.get_role(changed_role.role_id)
-                if not role:
+                channel_overwrites = c.overwrites
+
+                for changed_role in changed_roles[c.id]:
+                    role = ctx.guild.get_role(changed_role.role_id)
+                    if not role:
+                        continue
+                    channel_overwrites[role].send_messages = changed_role.original_value
+                try:
+                    await c.edit(overwrites=channel_overwrites, reason="Unlock")
+                except discord.Forbidden:
+                    await ctx.send(f"Failed to unlock {c}")
                     continue
-                channel_overwrites[role].send_messages = changed_role.original_value
-            try:
-                await c.edit(overwrites=channel_overwrites, reason="Unlock")
-            except discord.Forbidden:
-                await ctx.send(f"Failed to unlock {c}")
-                continue
-
-            await self.configuration.clear_changed_roles(c)
-            await c.send("🔓 Channel unlocked.")
-            await self.configuration.set_channel_lock_level(c, lock_level=0)
-            unlocked.append(c)
+
+                unlocked.append(c)
+                await c.send("🔓 Channel unlocked.")
+        finally:
+            # The unlocked channels are saved even if a later channel fails
+            if unlocked and not await self.configuration.unlock_channels(unlocked):
+                await ctx.send("⚠️ Failed to save the unlocked channels, they will still show as locked.")
 
         if unlocked:
             msg = f"🔓 **Unlock**: {ctx.author.mention} unlocked channels | {author}\n📝 __Channels__: {', '.join(c.mention for c in unlocked)}"
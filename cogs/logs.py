@@ -78,7 +78,8 @@ Thanks for stopping by and have a good time!
         if roles:
             await member.add_roles(*roles)
 
-        warns = [w async for w in self.warns.get_warnings(member)]
+        # Most members have no warns, the count is cached so those skip the query
+        warns = [w async for w in self.warns.get_warnings(member)] if await self.warns.get_warnings_count(member) else []
 
         if not warns:
             await self.bot.channels['server-logs'].send(msg)
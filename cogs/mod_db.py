@@ -5,6 +5,7 @@ import discord
 from discord.ext import commands
 from typing import TYPE_CHECKING
 from utils.checks import is_staff
+from utils.database import query_stats
 
 if TYPE_CHECKING:
     from kurisu import Kurisu
@@ -55,6 +56,32 @@ class ModDB(commands.Cog):
         else:
             await ctx.send(self.NOT_FOUND)
 
+    @is_staff('HalfOP')
+    @commands.command(name='dbstats')
+    async def db_stats(self, ctx: GuildContext):
+        """Shows the database pool utilization and query latencies. Staff only."""
+        embed = discord.Embed(title="Database statistics")
+        for lane, pool in self.bot.pools.items():
+            size = pool.get_size()
+            idle = pool.get_idle_size()
+            acquire_wait = query_stats.acquire_wait.get(lane)
+            value = f"{size - idle}/{size} connections in use (max {pool.get_max_size()})"
+            if acquire_wait:
+                p50, p95, p99 = acquire_wait.percentiles(50, 95, 99)
+                value += (f"\nAcquire wait p50={p50 * 1000:.2f}ms p95={p95 * 1000:.2f}ms p99={p99 * 1000:.2f}ms\n"
+                          f"{acquire_wait.count} connections acquired")
+            embed.add_field(name=f"Pool lane {lane}", value=value, inline=False)
+        if busiest := query_stats.busiest():
+            lines = '\n'.join(f"{table}.{operation}: n={histogram.count} mean={histogram.mean * 1000:.2f}ms "
+                              f"total={histogram.total:.2f}s" for table, operation, histogram in busiest)
+            embed.add_field(name="Queries by total time", value=f"```\n{lines}\n```", inline=False)
+        if query_stats.slow_queries:
+            lines = '\n'.join(f"{q.date:%H:%M:%S} {q.elapsed:.3f}s {q.table}.{q.operation}"
+                              for q in list(query_stats.slow_queries)[-10:])
+            embed.add_field(name=f"Slow queries (over {query_stats.slow_query_threshold}s)", value=f"```\n{lines}\n```",
+                            inline=False)
+        await ctx.send(embed=embed)
+
 
 async def setup(bot):
     await bot.add_cog(ModDB(bot))
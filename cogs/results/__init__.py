@@ -1,13 +1,38 @@
 from __future__ import annotations
 
 import discord
+import importlib.util
+import sys
 
-from . import switch, wiiu_support, wiiu_results, ctr_support, ctr_results
 from discord.ext import commands
 from typing import Optional, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from kurisu import Kurisu
+    from types import ModuleType
+
+
+def lazy_import(name: str) -> ModuleType:
+    """Returns the module, it is only executed when one of its attributes is first used."""
+    name = importlib.util.resolve_name(name, __name__)
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    assert spec is not None and spec.loader is not None
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+# The tables build thousands of results, they are loaded by the first lookup for their console
+switch = lazy_import('.switch')
+wiiu_support = lazy_import('.wiiu_support')
+wiiu_results = lazy_import('.wiiu_results')
+ctr_support = lazy_import('.ctr_support')
+ctr_results = lazy_import('.ctr_results')
 
 
 class Results(commands.Cog):
@@ -1,3 +1,5 @@
+import sys
+
 from typing import Optional
 
 
@@ -7,8 +9,11 @@ class Module:
     and possibly a second dictionary with extra information.
     A module itself is basically who raised the error or returned the result.
     """
+    # The tables have thousands of these, slots keep them small
+    __slots__ = ('name', 'data', 'summaries')
+
     def __init__(self, name, data={}, summaries={}):
-        self.name = name
+        self.name = sys.intern(name)
         self.data = data
         self.summaries = summaries
 
@@ -40,9 +45,12 @@ class ResultInfo:
     to provide information about the result, error, or support code, including a support
     webpage, if available.
     """
+    __slots__ = ('description', 'support_url', 'is_ban')
+
     def __init__(self, description='', support_url='', is_ban=False):
-        self.description = description
-        self.support_url = support_url
+        # The same descriptions and urls appear in several tables
+        self.description = sys.intern(description)
+        self.support_url = sys.intern(support_url)
         self.is_ban = is_ban
 
 
@@ -10,20 +10,29 @@ from kurisu import SERVER_LOGS_URL
 from typing import Optional, Union
 from utils.checks import is_staff_app
 from utils.converters import HackIDTransformer, DateTransformer
+from utils.database import pool_lanes
 
 
 @app_commands.guild_only
 class ServerLogs(commands.GroupCog, name="serverlogs"):
     """Command group for accesing the server logs"""
 
-    conn: asyncpg.Connection
+    pool: asyncpg.Pool
+
+    # The searches are long scans, they get the statement timeout of the bulk lane
+    pool_size = 2
 
     def __init__(self, bot):
         self.bot = bot
         self.emoji = discord.PartialEmoji.from_str('⚙')
 
     async def cog_load(self) -> None:
-        self.conn = await asyncpg.connect(SERVER_LOGS_URL)
+        self.pool = await asyncpg.create_pool(
+            SERVER_LOGS_URL, min_size=1, max_size=self.pool_size,
+            server_settings={'statement_timeout': str(pool_lanes['bulk'].statement_timeout)})
+
+    async def cog_unload(self) -> None:
+        await self.pool.close()
 
     channel_blacklist = ['minecraft-console', 'dev-trusted']
 
@@ -133,9 +142,10 @@ class ServerLogs(commands.GroupCog, name="serverlogs"):
 
         txt = ""
 
-        async with self.conn.transaction():
-            async for created_at, channel_name, username, content in self.conn.cursor(stmt, *bindings):
-                txt += f"[{channel_name}] [{created_at:%Y/%m/%d %H:%M:%S}] <{username} {content}>\n"
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                async for created_at, channel_name, username, content in conn.cursor(stmt, *bindings):
+                    txt += f"[{channel_name}] [{created_at:%Y/%m/%d %H:%M:%S}] <{username} {content}>\n"
 
         if not txt:
             return await interaction.edit_original_response(content="No messages found.")
@@ -179,9 +189,10 @@ class ServerLogs(commands.GroupCog, name="serverlogs"):
 
         txt = ""
 
-        async with self.conn.transaction():
-            async for channel_id, name, last_updated in self.conn.cursor(query, *args):
-                txt += f"{channel_id:18} | {name:50} | {last_updated:%Y/%m/%d %H:%M:%S}\n"
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                async for channel_id, name, last_updated in conn.cursor(query, *args):
+                    txt += f"{channel_id:18} | {name:50} | {last_updated:%Y/%m/%d %H:%M:%S}\n"
 
         if not txt:
             return await interaction.edit_original_response(content="No messages found.")
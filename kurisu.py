@@ -14,7 +14,9 @@ import sys
 import traceback
 
 from configparser import ConfigParser
+from contextlib import AsyncExitStack
 from datetime import datetime
+from time import perf_counter
 
 import pytz
 from discord import app_commands
@@ -22,7 +24,9 @@ from discord.ext import commands
 from subprocess import check_output, CalledProcessError
 from typing import Optional, Union
 from utils import WarnsManager, ConfigurationManager, RestrictionsManager, ExtrasManager, FiltersManager, UserLogManager
+from utils.managerbase import ManagerWarmup
 from utils.checks import InsufficientStaffRank
+from utils.database import migrate, pool_lanes, ChangeListener, instance_name, MemoryDatabase
 from utils.help import KuriHelp
 from utils.utils import create_error_embed
 from utils.context import KurisuContext
@@ -107,11 +111,12 @@ logger = logging.getLogger(__name__)
 class Kurisu(commands.Bot):
 
     user: discord.ClientUser
-    pool: asyncpg.Pool
+    pools: dict[str, asyncpg.Pool]
+    memory_database: Optional[MemoryDatabase]
     db_closed: bool
     tree: 'Kuritree'
 
-    def __init__(self, command_prefix, description, commit, branch, pool):
+    def __init__(self, command_prefix, description, commit, branch, pools, memory_database=None):
 
         intents = discord.Intents(guilds=True, members=True, messages=True, reactions=True, bans=True, message_content=True)
         allowed_mentions = discord.AllowedMentions(everyone=False, roles=False)
@@ -135,12 +140,21 @@ class Kurisu(commands.Bot):
         self.channels: dict[str, Union[discord.TextChannel, discord.VoiceChannel, discord.Thread]] = {}
 
         self.failed_cogs = []
+        # In seconds, by extension name. The import time runs until setup adds the cog
+        self.cog_import_times: dict[str, float] = {}
+        self.cog_load_times: dict[str, float] = {}
+        self._cog_added_at: Optional[float] = None
         self.channels_not_found = []
         self.roles_not_found = []
 
-        self.pool = pool
+        self.pools = pools
+        # Used instead of the pools when database_url is memory://
+        self.memory_database = memory_database
         self.db_closed = False
 
+        # Keeps the managers caches up to date with changes made outside this instance
+        self.changes = ChangeListener(pools.get('listen'))
+
         self.logs = UserLogManager(self)
 
         self.warns = WarnsManager(self)
@@ -148,6 +162,9 @@ class Kurisu(commands.Bot):
         self.restrictions = RestrictionsManager(self)
         self.extras = ExtrasManager(self)
         self.filters = FiltersManager(self)
+        # Loads the managers caches, wait_until_all_ready waits for it
+        self.warmup = ManagerWarmup(self.warns, self.configuration, self.restrictions, self.extras, self.filters)
+        self.warmup_task: Optional[asyncio.Task] = None
 
         self.err_channel: Optional[Union[discord.TextChannel, discord.VoiceChannel]] = None
         self.actions = []
@@ -159,6 +176,9 @@ class Kurisu(commands.Bot):
 
     async def setup_hook(self) -> None:
         self.session = aiohttp.ClientSession()
+        # Listening starts before the caches load so no change is missed in between
+        await self.changes.start(after=self.warmup.wait)
+        self.warmup_task = self.warmup.start()
         await self.load_cogs()
 
     async def get_context(self, origin: Union[discord.Interaction, discord.Message], /, *, cls=KurisuContext) -> KurisuContext:
@@ -203,11 +223,26 @@ class Kurisu(commands.Bot):
         self.err_channel = self.channels['bot-err']
         self.tree.err_channel = self.err_channel
 
+        await self.warmup.wait()
+
         startup_message = f'{self.user.name} has started! {self.guild} has {self.guild.member_count:,} members!'
         embed = discord.Embed(title=f"{self.user.name} has started!",
                               description=f"{self.guild} has {self.guild.member_count:,} members!", colour=0xb01ec3)
-        if self.failed_cogs or self.roles_not_found or self.channels_not_found:
+        embed.add_field(name=f"Managers loaded in {self.warmup.elapsed:.2f}s:",
+                        value='\n'.join(f"{name} - {elapsed:.2f}s" for name, elapsed in self.warmup.load_times.items())
+                        or "None", inline=False)
+        slowest_cogs = sorted(self.cog_load_times, key=lambda c: self.cog_import_times[c] + self.cog_load_times[c],
+                              reverse=True)[:10]
+        embed.add_field(name="Slowest cogs (import/load):",
+                        value='\n'.join(f"{cog} - {self.cog_import_times[cog] * 1000:.0f}ms/"
+                                        f"{self.cog_load_times[cog] * 1000:.0f}ms" for cog in slowest_cogs) or "None",
+                        inline=False)
+        if self.failed_cogs or self.warmup.failed or self.roles_not_found or self.channels_not_found:
             embed.colour = 0xe50730
+            if self.warmup.failed:
+                embed.add_field(name="Failed to load managers:",
+                                value='\n'.join(f"**{name}** - {type(exc).__name__}" for name, exc in self.warmup.failed),
+                                inline=False)
             if self.failed_cogs:
                 embed.add_field(
                     name="Failed to load cogs:",
@@ -242,17 +277,37 @@ class Kurisu(commands.Bot):
 
     async def close(self):
         self.db_closed = True
+        if self.warmup_task is not None:
+            self.warmup_task.cancel()
         await super().close()
         await self.session.close()
-        await self.pool.close()
+        await self.changes.stop()
+        for pool in self.pools.values():
+            await pool.close()
+
+    async def add_cog(self, cog: commands.Cog, /, **kwargs) -> None:
+        # Every setup adds its cog first, so this is where load_cogs ends the import time of an extension
+        self._cog_added_at = perf_counter()
+        await super().add_cog(cog, **kwargs)
 
     async def load_cogs(self):
+        # One at a time in the order of cogs, load_extension executes the module synchronously so
+        # running them as tasks wouldn't overlap anything
+        start = perf_counter()
         for extension in cogs:
+            loading = perf_counter()
+            self._cog_added_at = None
             try:
                 await self.load_extension(extension)
             except commands.ExtensionFailed as e:
                 logger.error("%s failed to load.", extension)
                 self.failed_cogs.append((extension, type(e.original).__name__, e.original))
+            else:
+                loaded = perf_counter()
+                added = self._cog_added_at or loaded
+                self.cog_import_times[extension] = added - loading
+                self.cog_load_times[extension] = loaded - added
+        logger.info("Loaded %d cogs in %.2fs", len(self.cog_load_times), perf_counter() - start)
 
     async def load_channels(self):
         channels = ['announcements', 'welcome-and-rules', '3ds-assistance-1', '3ds-assistance-2', 'wiiu-assistance',
@@ -261,10 +316,12 @@ class Kurisu(commands.Bot):
                     'voice-and-music', 'bot-cmds', 'bot-talk', 'mods', 'mod-mail', 'mod-logs', 'server-logs', 'bot-err',
                     'elsewhere', 'newcomers', 'nintendo-discussion', 'tech-talk', 'hardware', 'streaming-gamer']
 
+        # One query for all the channels, the names are resolved against the guild cache
+        channel_ids = await self.configuration.get_channel_ids()
+        missing = {}
         for n in channels:
-            db_channel = await self.configuration.get_channel_by_name(n)
-            if db_channel:
-                channel_id = db_channel[0]
+            channel_id = channel_ids.get(n)
+            if channel_id:
                 channel = self.guild.get_channel(channel_id)
                 if channel and isinstance(channel, (discord.TextChannel, discord.VoiceChannel)):
                     self.channels[n] = channel
@@ -272,10 +329,12 @@ class Kurisu(commands.Bot):
             channel = discord.utils.get(self.guild.channels, name=n)
             if channel and isinstance(channel, (discord.TextChannel, discord.VoiceChannel)):
                 self.channels[n] = channel
-                await self.configuration.add_channel(name=n, channel=channel)
+                missing[n] = channel
             else:
                 self.channels_not_found.append(n)
                 logger.warning("Failed to find channel %s", n)
+        if missing:
+            await self.configuration.add_channels(missing.items())
 
     async def load_roles(self):
         roles = ['Helpers', 'Staff', 'HalfOP', 'OP', 'SuperOP', 'Owner', 'On-Duty 3DS', 'On-Duty Wii U',
@@ -283,10 +342,11 @@ class Kurisu(commands.Bot):
                  'No-Help', 'No-elsewhere', 'No-Memes', 'No-art', '#art-discussion', 'No-Embed', '#elsewhere',
                  'Small Help', 'meta-mute', 'appeal-mute', 'crc', 'No-Tech', 'help-mute', 'streamer(temp)', '🍰']
 
+        role_ids = await self.configuration.get_role_ids()
+        missing = {}
         for n in roles:
-            db_role = await self.configuration.get_role(n)
-            if db_role:
-                role_id = db_role[0]
+            role_id = role_ids.get(n)
+            if role_id:
                 role = self.guild.get_role(role_id)
                 if role:
                     self.roles[n] = role
@@ -294,10 +354,12 @@ class Kurisu(commands.Bot):
             role = discord.utils.get(self.guild.roles, name=n)
             if role:
                 self.roles[n] = role
-                await self.configuration.add_role(name=n, role=role)
+                missing[n] = role
             else:
                 self.roles_not_found.append(n)
                 logger.warning("Failed to find role %s", n)
+        if missing:
+            await self.configuration.add_roles(missing)
 
     async def on_command_error(self, ctx: KurisuContext, exc: commands.CommandError):
         author = ctx.author
@@ -467,10 +529,24 @@ async def startup():
         commit = os.environ.get('COMMIT_SHA')
         branch = os.environ.get('COMMIT_BRANCH')
 
-    async with asyncpg.create_pool(DATABASE_URL, min_size=20, max_size=20) as pool:
+    async with AsyncExitStack() as stack:
+        pools = {}
+        memory_database = None
+        if DATABASE_URL == 'memory://':
+            logger.warning("Using the in-memory database, nothing will be saved")
+            memory_database = MemoryDatabase()
+        else:
+            for name, lane in pool_lanes.items():
+                # The database managers generate a query per table and column set, keep their prepared statements around
+                pools[name] = await stack.enter_async_context(
+                    asyncpg.create_pool(DATABASE_URL, min_size=lane.size, max_size=lane.size, statement_cache_size=512,
+                                        server_settings={'statement_timeout': str(lane.statement_timeout),
+                                                         'application_name': instance_name}))
+            schema_version = await migrate(pools['bulk'])
+            logger.info("Database schema is at version %d", schema_version)
         logger.info("Starting Kurisu on commit %s on branch %s", commit, branch)
         bot = Kurisu(command_prefix=['.', '!'], description="Kurisu, the bot for Nintendo Homebrew!", commit=commit,
-                     branch=branch, pool=pool)
+                     branch=branch, pools=pools, memory_database=memory_database)
         bot.help_command = KuriHelp()
         await bot.start(TOKEN)
 
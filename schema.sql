@@ -1,6 +1,6 @@
 drop table if exists approvedinvites, channels, filteredwords, flags, levenshteinwords, members, friendcodes,
     reminders, roles, rules, softbans, staff, tags, restrictions, timedroles, warns,
-    whitelistedwords, citizens, voteviews, votes, changedroles;
+    whitelistedwords, citizens, voteviews, votes, changedroles, schema_version;
 
 create table approvedinvites
 (
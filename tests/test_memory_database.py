@@ -0,0 +1,39 @@
+import asyncio
+from types import SimpleNamespace
+from typing import NamedTuple
+
+from utils.configuration import ConfigurationManager
+from utils.database import MemoryDatabase
+
+
+class FakeChannel(NamedTuple):
+    id: int
+    name: str
+
+
+def make_bot():
+    return SimpleNamespace(memory_database=MemoryDatabase(), pools={}, db_closed=False,
+                           changes=SimpleNamespace(subscribe=lambda *args: None, add_reload=lambda reload: None))
+
+
+def test_lockdown_round_trip():
+    async def run():
+        configuration = ConfigurationManager(make_bot())
+        locked = FakeChannel(3, 'hacking-general')
+        other = FakeChannel(4, 'off-topic')
+        await configuration.add_channels([(locked.name, locked), (other.name, other)])
+
+        assert await configuration.lock_channels({locked: [(10, True), (11, None)]}, lock_level=2)
+        db_channels = await configuration.get_channels_by_id([locked.id, other.id])
+        assert db_channels[locked.id].lock_level == 2
+        assert db_channels[other.id].lock_level == 0
+        changed_roles = await configuration.get_changed_roles_many([locked, other])
+        assert [(cr.channel_id, cr.role_id, cr.original_value) for cr in changed_roles[locked.id]] == \
+            [(3, 10, True), (3, 11, None)]
+        assert changed_roles[other.id] == []
+
+        assert await configuration.unlock_channels([locked])
+        assert (await configuration.get_channel(locked.id)).lock_level == 0
+        assert (await configuration.get_changed_roles_many([locked]))[locked.id] == []
+
+    asyncio.run(run())
@@ -0,0 +1,88 @@
+import time
+
+from collections import deque
+from typing import TYPE_CHECKING, Generic, TypeVar
+
+if TYPE_CHECKING:
+    from typing import Hashable, Optional, Deque
+    from discord import Message
+
+T = TypeVar('T')
+
+
+class SlidingWindow(Generic[T]):
+    """Keeps the items added per key during the last ``window`` seconds.
+
+    Expired items are evicted when a key is updated, keys that went idle are dropped by :meth:`sweep`."""
+
+    __slots__ = ('window', '_entries', '_weights')
+
+    def __init__(self, window: float):
+        self.window = window
+        self._entries: 'dict[Hashable, Deque[tuple[float, int, T]]]' = {}
+        self._weights: 'dict[Hashable, int]' = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key: 'Hashable'):
+        return key in self._entries
+
+    def _evict(self, key: 'Hashable', entries: 'Deque[tuple[float, int, T]]', now: float):
+        limit = now - self.window
+        while entries and entries[0][0] <= limit:
+            _, weight, _ = entries.popleft()
+            self._weights[key] -= weight
+
+    def add(self, key: 'Hashable', item: T, weight: int = 1, timestamp: 'Optional[float]' = None) -> int:
+        """Adds an item to a key and returns the total weight of the items in the window."""
+        now = time.time() if timestamp is None else timestamp
+        entries = self._entries.get(key)
+        if entries is None:
+            entries = self._entries[key] = deque()
+            self._weights[key] = 0
+        else:
+            self._evict(key, entries, now)
+        entries.append((now, weight, item))
+        self._weights[key] += weight
+        return self._weights[key]
+
+    def items(self, key: 'Hashable') -> list[T]:
+        """Returns the items of a key in the order they were added."""
+        return [item for _, _, item in self._entries.get(key, ())]
+
+    def clear(self, key: 'Hashable'):
+        self._entries.pop(key, None)
+        self._weights.pop(key, None)
+
+    def sweep(self, timestamp: 'Optional[float]' = None):
+        """Evicts the expired items of every key and drops the empty keys."""
+        now = time.time() if timestamp is None else timestamp
+        for key, entries in list(self._entries.items()):
+            self._evict(key, entries, now)
+            if not entries:
+                self.clear(key)
+
+
+class MessageRecord:
+    """The parts of a message the antispam checks need, so the message itself isn't kept alive."""
+
+    __slots__ = ('id', 'channel_id', 'author_id', 'mentions', 'preview')
+
+    # Enough to identify the message in the mod-logs without keeping the full content around
+    preview_length = 200
+
+    def __init__(self, message_id: int, channel_id: int, author_id: int, mentions: int, preview: str):
+        self.id = message_id
+        self.channel_id = channel_id
+        self.author_id = author_id
+        self.mentions = mentions
+        self.preview = preview
+
+    @classmethod
+    def from_message(cls, message: 'Message') -> 'MessageRecord':
+        return cls(message_id=message.id,
+                   channel_id=message.channel.id,
+                   author_id=message.author.id,
+                   mentions=len(message.mentions),
+                   preview=message.content[:cls.preview_length])
@@ -1,16 +1,18 @@
 import asyncio
 
+from collections import defaultdict
+
 from discord import Member, User
 from enum import IntEnum
 from typing import TYPE_CHECKING, NamedTuple
 
 import discord
 
-from .managerbase import BaseManager
+from .managerbase import BaseManager, collect
 from .database import ConfigurationDatabaseManager
 
 if TYPE_CHECKING:
-    from typing import Union, Optional, AsyncGenerator
+    from typing import Union, Optional, AsyncGenerator, Iterable
     from kurisu import Kurisu
     from . import OptionalMember
     from .database import ChangedRole
@@ -42,22 +44,36 @@ class ConfigurationManager(BaseManager, db_manager=ConfigurationDatabaseManager)
 
     def __init__(self, bot: 'Kurisu'):
         super().__init__(bot)
-        asyncio.create_task(self.setup())
+        # Ids known to be in the members table, so add_member can skip the insert
+        self._members: set[int] = set()
+        bot.changes.subscribe('staff', self.db, self._staff_changed)
+        bot.changes.subscribe('flags', self.db, self._flag_changed)
+        bot.changes.subscribe('rules', self.db, self._rule_changed)
+        bot.changes.subscribe('channels', self.db, self._channel_changed)
+        bot.changes.subscribe('members', self.db, self._member_changed)
+        bot.changes.add_reload(self.setup)
 
     async def setup(self):
-        flag = await self.db.get_flag('auto_probation')
+        # The tables are loaded concurrently, each on its own pooled connection
+        flag, staff, helpers, nofilter_channels, rules, members = await asyncio.gather(
+            self.db.get_flag('auto_probation'), collect(self.db.get_all_staff()), collect(self.db.get_all_helpers()),
+            collect(self.db.get_all_nofilter_channels()), collect(self.db.get_rules()), collect(self.db.get_members()))
 
         self._auto_probation = flag[1] if flag else False
 
-        self._staff: dict[int, StaffRank] = {user_id: StaffRank[position] async for user_id, position in self.db.get_all_staff()}
+        self._staff: dict[int, StaffRank] = {user_id: StaffRank[position] for user_id, position in staff}
 
-        self._helpers: dict[int, str] = {user_id: console async for user_id, console in self.db.get_all_helpers()}
+        self._helpers: dict[int, str] = dict(helpers)
 
-        self._nofilter_list: list[int] = [c async for c in self.db.get_all_nofilter_channels()]
+        self._nofilter_list: list[int] = nofilter_channels
 
-        self._rules: dict[int, str] = {rule_id: description async for rule_id, description in self.db.get_rules()}
+        self._rules: dict[int, str] = dict(rules)
 
-        self._watch_list: list[int] = [user_id async for user_id, watched in self.db.get_members() if watched is True]
+        self._watch_list: list[int] = []
+        for user_id, watched in members:
+            self._members.add(user_id)
+            if watched is True:
+                self._watch_list.append(user_id)
 
     @property
     def staff(self) -> dict[int, StaffRank]:
@@ -91,8 +107,49 @@ class ConfigurationManager(BaseManager, db_manager=ConfigurationDatabaseManager)
     def auto_probation_status(self):
         return self._auto_probation
 
+    # changes made outside this instance
+
+    def _staff_changed(self, key: dict, row: 'Optional[tuple]'):
+        self._staff.pop(key['user_id'], None)
+        self._helpers.pop(key['user_id'], None)
+        if row:
+            user_id, position, console = row
+            if position != 'Helper':
+                self._staff[user_id] = StaffRank[position]
+            if console is not None:
+                self._helpers[user_id] = console
+
+    def _flag_changed(self, key: dict, row: 'Optional[tuple]'):
+        if key['name'] == 'auto_probation':
+            self._auto_probation = row[1] if row else False
+
+    def _rule_changed(self, key: dict, row: 'Optional[tuple]'):
+        if row:
+            self._rules[row[0]] = row[1]
+        else:
+            self._rules.pop(key['id'], None)
+
+    def _channel_changed(self, key: dict, row: 'Optional[tuple]'):
+        if key['id'] in self._nofilter_list:
+            self._nofilter_list.remove(key['id'])
+        if row and not row[2]:
+            self._nofilter_list.append(row[0])
+
+    def _member_changed(self, key: dict, row: 'Optional[tuple]'):
+        if key['id'] in self._watch_list:
+            self._watch_list.remove(key['id'])
+        if row:
+            self._members.add(row[0])
+            if row[1] is True:
+                self._watch_list.append(row[0])
+        else:
+            self._members.discard(key['id'])
+
     async def add_member(self, user_id: int):
+        if user_id in self._members:
+            return
         await self.db.add_member(user_id)
+        self._members.add(user_id)
 
     async def set_watch(self, user_id: int, watched: bool):
 
@@ -168,23 +225,41 @@ class ConfigurationManager(BaseManager, db_manager=ConfigurationDatabaseManager)
         else:
             await self.db.add_role(name=name, role_id=role.id)
 
+    async def add_roles(self, roles: 'dict[str, discord.Role]'):
+        await self.db.add_roles([(role.id, name) for name, role in roles.items()])
+
     async def get_role(self, name: str) -> 'Optional[tuple[int, str]]':
         return await self.db.get_role(name)
 
+    async def get_role_ids(self) -> 'dict[str, int]':
+        """Returns the id of every role in the database by name."""
+        return {name: role_id for role_id, name in await self.db.get_roles()}
+
     async def add_channel(self, name: str, channel: 'Union[discord.TextChannel, discord.VoiceChannel, discord.Thread, discord.CategoryChannel]'):
         if await self.get_channel_by_name(name):
             return await self.db.update_channel(channel.id, name)
         else:
             return await self.db.add_channel(channel.id, name)
 
+    async def add_channels(self, channels: 'Iterable[tuple[str, Union[discord.TextChannel, discord.VoiceChannel, discord.Thread, discord.CategoryChannel]]]'):
+        await self.db.add_channels([(channel.id, name) for name, channel in channels])
+
     async def get_channel_by_name(self, name: str):
         return await self.db.get_channel_by_name(name)
 
+    async def get_channel_ids(self) -> 'dict[str, int]':
+        """Returns the id of every channel in the database by name."""
+        return {name: channel_id for channel_id, name, *_ in await self.db.get_channels()}
+
     async def get_channel(self, channel_id: int) -> 'Optional[DBChannel]':
         c = await self.db.get_channel(channel_id)
         if c:
             return DBChannel(id=c[0], name=c[1], filtered=c[2], lock_level=c[3], mod_channel=c[4])
 
+    async def get_channels_by_id(self, channel_ids: 'list[int]') -> 'dict[int, DBChannel]':
+        return {c[0]: DBChannel(id=c[0], name=c[1], filtered=c[2], lock_level=c[3], mod_channel=c[4])
+                for c in await self.db.get_channels_by_id(channel_ids)}
+
     async def set_channel_lock_level(self, channel: 'Union[discord.TextChannel, discord.Thread, discord.VoiceChannel]', lock_level: int):
         await self.db.set_channel_lock_level(channel.id, lock_level)
 
@@ -208,6 +283,14 @@ class ConfigurationManager(BaseManager, db_manager=ConfigurationDatabaseManager)
     async def add_changed_roles(self, roles: 'list[tuple[int, Optional[bool]]]', channel: 'Union[discord.TextChannel, discord.Thread, discord.VoiceChannel]'):
         await self.db.add_changed_roles(roles, channel.id)
 
+    async def lock_channels(self, changes: 'dict[Union[discord.TextChannel, discord.Thread, discord.VoiceChannel], list[tuple[int, Optional[bool]]]]', lock_level: int) -> bool:
+        """Stores the changed roles and the lock level of the locked down channels, returns False if they weren't saved."""
+        return await self.db.lock_channels({channel.id: roles for channel, roles in changes.items()}, lock_level)
+
+    async def unlock_channels(self, channels: 'list[Union[discord.TextChannel, discord.Thread, discord.VoiceChannel]]') -> bool:
+        """Clears the changed roles and the lock level of the channels, returns False if they weren't saved."""
+        return await self.db.unlock_channels([channel.id for channel in channels])
+
     async def delete_changed_role(self, role: discord.Role, channel: 'Union[discord.TextChannel, discord.Thread, discord.VoiceChannel]'):
         await self.db.delete_changed_role(role.id, channel.id)
 
@@ -215,6 +298,13 @@ class ConfigurationManager(BaseManager, db_manager=ConfigurationDatabaseManager)
         async for cr in self.db.get_changed_roles(channel.id):
             yield cr
 
+    async def get_changed_roles_many(self, channels: 'list[Union[discord.TextChannel, discord.Thread, discord.VoiceChannel]]') -> 'dict[int, list[ChangedRole]]':
+        """Returns the changed roles of the channels by channel id."""
+        changed_roles = defaultdict(list)
+        for cr in await self.db.get_changed_roles_many([channel.id for channel in channels]):
+            changed_roles[cr.channel_id].append(cr)
+        return changed_roles
+
     async def clear_changed_roles(self, channel: 'Union[discord.TextChannel, discord.VoiceChannel]'):
         await self.db.clear_changed_roles(channel.id)
 
@@ -1,12 +1,18 @@
 # from .actionslog import ActionsLogDatabaseManager
-from .common import BaseDatabaseManager, DatabaseManagerError
+from .common import BaseDatabaseManager, DatabaseManagerError, PoolLane, pool_lanes
 from .configuration import ConfigurationDatabaseManager, ChangedRole
 from .filters import FiltersDatabaseManager, LevenshteinWord, FilteredWord, FilterKind, ApprovedInvite
 from .restrictions import RestrictionsDatabaseManager
 from .warns import WarnsDatabaseManager, WarnEntry
 from .extras import ExtrasDatabaseManager, Tag, Reminder, TimedRole
+from .migrations import migrate
+from .stats import QueryStats, query_stats
+from .notifications import ChangeListener, instance_name
+from .memory import MemoryDatabase, memory_managers
 
 __all__ = ['BaseDatabaseManager', 'DatabaseManagerError', 'ConfigurationDatabaseManager',
            'FiltersDatabaseManager', 'RestrictionsDatabaseManager', 'ExtrasDatabaseManager',
            'WarnsDatabaseManager', 'WarnEntry', 'ChangedRole', 'ApprovedInvite',
-           'Tag', 'Reminder', 'TimedRole', 'LevenshteinWord', 'FilteredWord', 'FilterKind']
+           'Tag', 'Reminder', 'TimedRole', 'LevenshteinWord', 'FilteredWord', 'FilterKind', 'migrate',
+           'QueryStats', 'query_stats', 'PoolLane', 'pool_lanes', 'ChangeListener', 'instance_name',
+           'MemoryDatabase', 'memory_managers']
@@ -1,17 +1,18 @@
-from typing import TYPE_CHECKING
+from contextlib import asynccontextmanager
+from time import perf_counter
+from typing import TYPE_CHECKING, NamedTuple
 
 import asyncpg
 
 import logging
 
+from .stats import query_stats
+
 if TYPE_CHECKING:
-    from typing import AsyncGenerator, KeysView, Optional
+    from typing import AsyncGenerator, AsyncIterator, Iterable, Optional
     from kurisu import Kurisu
     Tables = dict[str, list[str]]
-
-# noinspection PyUnreachableCode
-if __debug__:
-    from itertools import chain
+    QueryShape = tuple[str, str, tuple[str, ...], tuple[str, ...]]
 
 
 class DatabaseManagerError(Exception):
@@ -33,24 +34,86 @@ class ColumnValueFormatter:
 logger = logging.getLogger(__name__)
 
 
+class PoolLane(NamedTuple):
+    size: int
+    # In milliseconds, the server cancels statements running for longer
+    statement_timeout: int
+
+
+# Each lane is a separate pool, so long scans and cache loads never take the connections commands and
+# message enforcement are waiting for.
+pool_lanes = {
+    # Commands, message enforcement and other queries someone is waiting on
+    'interactive': PoolLane(size=14, statement_timeout=10_000),
+    # Startup cache loads, scans over whole tables and background loops
+    'bulk': PoolLane(size=6, statement_timeout=300_000),
+    # Held by the ChangeListener for LISTEN
+    'listen': PoolLane(size=1, statement_timeout=10_000),
+}
+
+
 class BaseDatabaseManager:
     """Manages operations for Kurisu."""
 
     tables: 'Tables'
+    # Generated SQL keyed by (operation, table, columns, conditions), shared by the instances of a manager.
+    # Stable query text also lets asyncpg reuse the statements it prepared on each pooled connection.
+    _queries: 'dict[QueryShape, str]'
+    # Rows fetched per round-trip by the cursor in _select
+    cursor_prefetch: int = 100
 
     def __init__(self, bot: 'Kurisu'):
         self.bot = bot
         self.log = logger
-        self.pool = bot.pool
+        self.pools = bot.pools
 
     # until PyCharm recognizes __init_subclass__ properly, these inspections must be disabled
     # noinspection PyMethodOverriding,PyArgumentList
     def __init_subclass__(cls, *, tables: 'Tables', **kwargs):
         cls.tables = tables
+        cls._queries = {}
 
     def _generate_id(self):
         return
 
+    @asynccontextmanager
+    async def _acquire(self, table: str, operation: str, query: 'Optional[str]' = None, *,
+                       lane: str = 'interactive', record: bool = True) -> 'AsyncIterator[asyncpg.Connection]':
+        """Acquires a connection from a pool lane, recording the wait for it and how long the query held it.
+
+        Cursors pass record=False, _stream records their fetches instead."""
+        start = perf_counter()
+        async with self.pools[lane].acquire() as conn:
+            acquired = perf_counter()
+            query_stats.record_acquire(lane, acquired - start)
+            try:
+                yield conn
+            finally:
+                if record:
+                    query_stats.record(table, operation, perf_counter() - acquired, query)
+
+    async def _stream(self, conn: asyncpg.Connection, table: str, operation: str, query: str,
+                      *args) -> 'AsyncGenerator[asyncpg.Record, None]':
+        """Yields the rows of a query through a server-side cursor, must run inside a transaction.
+
+        Only the time spent fetching is recorded, not the time the consumer takes between the batches."""
+        elapsed = 0.0
+        try:
+            start = perf_counter()
+            cursor = await conn.cursor(query, *args)
+            records = await cursor.fetch(self.cursor_prefetch)
+            elapsed += perf_counter() - start
+            while records:
+                for record in records:
+                    yield record
+                if len(records) < self.cursor_prefetch:
+                    break
+                start = perf_counter()
+                records = await cursor.fetch(self.cursor_prefetch)
+                elapsed += perf_counter() - start
+        finally:
+            query_stats.record(table, operation, elapsed, query)
+
     def _parse_status(self, res: str) -> int:
         split = res.split(' ')
         if len(split) == 3:
@@ -64,113 +127,161 @@ class BaseDatabaseManager:
             return 0
         return rows
 
-    def _format_select_vars(self, keys: 'KeysView[str]', *, start: int = 1) -> str:
-        assert not self.bot.db_closed
-        assert all(k in chain.from_iterable(x for x in self.tables.values()) for k in keys)
-
-        if len(keys) == 0:
+    def _format_select_vars(self, keys: 'Iterable[str]', *, start: int = 1) -> str:
+        if not keys:
             return ''
         return 'WHERE ' + ' AND '.join(f'{c} = ${n}' for n, c in enumerate(keys, start=start))
 
-    def _format_insert_vars(self, keys: 'KeysView[str]', *, start: int = 1) -> str:
-        assert not self.bot.db_closed
-        assert keys
-        assert all(k in chain.from_iterable(x for x in self.tables.values()) for k in keys)
-
+    def _format_insert_vars(self, keys: 'Iterable[str]', *, start: int = 1) -> str:
         return ', '.join(f'${n}' for n, c in enumerate(keys, start=start))
 
-    def _format_update_vars(self, keys: 'KeysView[str]', start: int = 1):
-        assert not self.bot.db_closed
-        assert keys
-        assert all(k in chain.from_iterable(x for x in self.tables.values()) for k in keys)
-
+    def _format_update_vars(self, keys: 'Iterable[str]', start: int = 1):
         return 'SET ' + ', '.join(f'{c} = ${n}' for n, c in enumerate(keys, start=start))
 
-    def _format_cols(self, keys: 'KeysView[str]') -> str:
-        assert not self.bot.db_closed
-        assert keys
-        assert all(k in chain.from_iterable(x for x in self.tables.values()) for k in keys)
-
+    def _format_cols(self, keys: 'Iterable[str]') -> str:
         return ', '.join(f'{c}' for c in keys)
 
-    async def _select(self, table: str, **values) -> 'AsyncGenerator[tuple, None]':
-        assert not self.bot.db_closed
+    def _query(self, operation: str, table: str, columns: 'tuple[str, ...]' = (),
+               conditions: 'tuple[str, ...]' = ()) -> str:
+        """Returns the SQL for an operation on a table with the given columns and conditions.
+
+        The query is generated and the columns are validated the first time a shape is used."""
+        key = (operation, table, columns, conditions)
+        try:
+            return self._queries[key]
+        except KeyError:
+            pass
+
         assert self.tables
         assert table in self.tables
-        assert all(k in self.tables[table] for k in values.keys())
+        assert all(k in self.tables[table] for k in columns)
+        assert all(k in self.tables[table] for k in conditions)
+
+        if operation == 'select':
+            query = f'SELECT * FROM {table} {self._format_select_vars(conditions)}'
+        elif operation == 'select_any':
+            assert len(conditions) == 1
+            query = f'SELECT * FROM {table} WHERE {conditions[0]} = ANY($1)'
+        elif operation == 'count':
+            query = f'SELECT COUNT(*) FROM {table} {self._format_select_vars(conditions)}'
+        elif operation == 'insert':
+            assert columns
+            query = f'INSERT INTO {table} ({self._format_cols(columns)}) VALUES ({self._format_insert_vars(columns)})'
+        elif operation == 'upsert':
+            assert columns
+            assert conditions
+            updated = [c for c in columns if c not in conditions]
+            action = f'DO UPDATE SET {", ".join(f"{c} = excluded.{c}" for c in updated)}' if updated else 'DO NOTHING'
+            query = (f'INSERT INTO {table} ({self._format_cols(columns)}) VALUES ({self._format_insert_vars(columns)}) '
+                     f'ON CONFLICT ({self._format_cols(conditions)}) {action}')
+        elif operation == 'update':
+            assert columns
+            query = (f'UPDATE {table} {self._format_update_vars(columns)} '
+                     f'{self._format_select_vars(conditions, start=len(columns) + 1)}')
+        elif operation == 'delete':
+            assert conditions
+            query = f'DELETE FROM {table} {self._format_select_vars(conditions)}'
+        else:
+            raise DatabaseManagerError(f'Unknown operation {operation}')
+
+        self._queries[key] = query
+        return query
+
+    async def _select(self, table: str, *, lane: str = 'bulk', **values) -> 'AsyncGenerator[tuple, None]':
+        """Streams the rows through a server-side cursor, for large scans. Uses the bulk lane by default.
+
+        The connection is held until the iteration is done, use _fetch for small result sets."""
+        assert not self.bot.db_closed
+        query = self._query('select', table, conditions=tuple(values))
 
         conn: asyncpg.Connection
 
-        async with self.pool.acquire() as conn:
+        async with self._acquire(table, 'select', query, lane=lane, record=False) as conn:
             async with conn.transaction():
-                query = f'SELECT * FROM {table} {self._format_select_vars(values.keys())}'
                 self.log.debug(f'Executed SELECT query in table {table} with parameters %s',
                                ColumnValueFormatter(values))
-                async for record in conn.cursor(query, *values.values()):
+                async for record in self._stream(conn, table, 'select', query, *values.values()):
                     yield record
 
-    async def _select_one(self, table: str, **values) -> 'Optional[tuple]':
+    async def _fetch(self, table: str, *, lane: str = 'interactive', **values) -> 'list[tuple]':
+        """Fetches all the rows in one round-trip and releases the connection right away."""
         assert not self.bot.db_closed
-        assert self.tables
-        assert table in self.tables
-        assert all(k in self.tables[table] for k in values.keys())
+        query = self._query('select', table, conditions=tuple(values))
 
         conn: asyncpg.Connection
 
-        async with self.pool.acquire() as conn:
+        async with self._acquire(table, 'select', query, lane=lane) as conn:
+            records = await conn.fetch(query, *values.values())
+        self.log.debug(f'Executed SELECT query in table {table} with parameters %s',
+                       ColumnValueFormatter(values))
+        return records
+
+    async def _fetch_any(self, table: str, column: str, values: 'Iterable', *,
+                         lane: str = 'interactive') -> 'list[tuple]':
+        """Fetches the rows where the column has any of the values, in one query."""
+        assert not self.bot.db_closed
+        query = self._query('select_any', table, conditions=(column,))
+        values = list(values)
+        if not values:
+            return []
+
+        conn: asyncpg.Connection
+
+        async with self._acquire(table, 'select', query, lane=lane) as conn:
+            records = await conn.fetch(query, values)
+        self.log.debug(f'Executed SELECT ANY query in table {table} with %d values for {column}', len(values))
+        return records
+
+    async def _select_one(self, table: str, *, lane: str = 'interactive', **values) -> 'Optional[tuple]':
+        assert not self.bot.db_closed
+        query = self._query('select', table, conditions=tuple(values))
+
+        conn: asyncpg.Connection
+
+        async with self._acquire(table, 'select', query, lane=lane) as conn:
             async with conn.transaction():
-                query = f'SELECT * FROM {table} {self._format_select_vars(values.keys())}'
                 self.log.debug(f'Executed SELECT query in table {table} with parameters %s',
                                ColumnValueFormatter(values))
                 return await conn.fetchrow(query, *values.values())
 
-    async def _row_count(self, table: str, **values) -> int:
+    async def get_row(self, table: str, **values) -> 'Optional[tuple]':
+        """Get the row of a table matching the values."""
+        return await self._select_one(table, **values)
+
+    async def _row_count(self, table: str, *, lane: str = 'interactive', **values) -> int:
         assert not self.bot.db_closed
-        assert self.tables
-        assert table in self.tables
-        assert all(k in self.tables[table] for k in values.keys())
+        query = self._query('count', table, conditions=tuple(values))
 
         conn: asyncpg.Connection
-        async with self.pool.acquire() as conn:
+        async with self._acquire(table, 'count', query, lane=lane) as conn:
             async with conn.transaction():
-                query = f'SELECT COUNT(*) FROM {table} {self._format_select_vars(values.keys())}'
                 record = await conn.fetchrow(query, *values.values())
                 self.log.debug(f'Executed SELECT COUNT() query in table {table} with parameters %s',
                                ColumnValueFormatter(values))
                 return record[0]
 
-    async def _insert(self, table: str, **values) -> int:
+    async def _insert(self, table: str, *, lane: str = 'interactive', **values) -> int:
         assert not self.bot.db_closed
-        assert self.tables
-        assert table in self.tables
-        assert values
-        assert all(k in self.tables[table] for k in values.keys())
+        query = self._query('insert', table, columns=tuple(values))
 
         conn: asyncpg.Connection
-        async with self.pool.acquire() as conn:
+        async with self._acquire(table, 'insert', query, lane=lane) as conn:
             async with conn.transaction():
-                query = (f'INSERT INTO {table} ({self._format_cols(values.keys())}) '
-                         f'VALUES ({self._format_insert_vars(values.keys())})')
                 try:
                     res = await conn.execute(query, *values.values())
                 except asyncpg.IntegrityConstraintViolationError:
                     self.log.error(f'Exception when inserting values into table {table}', exc_info=True)
                     return 0
-                self.log.debug(f'Executed SELECT query in table {table} with parameters %s',
+                self.log.debug(f'Executed INSERT query in table {table} with parameters %s',
                                ColumnValueFormatter(values))
         return self._parse_status(res)
 
-    async def _update(self, table: str, values: dict, **conditions) -> int:
+    async def _update(self, table: str, values: dict, *, lane: str = 'interactive', **conditions) -> int:
         assert not self.bot.db_closed
-        assert self.tables
-        assert table in self.tables
-        assert values
-        assert all(k in self.tables[table] for k in values.keys())
-        assert all(k in self.tables[table] for k in conditions.keys())
-        async with self.pool.acquire() as conn:
+        query = self._query('update', table, columns=tuple(values), conditions=tuple(conditions))
+
+        async with self._acquire(table, 'update', query, lane=lane) as conn:
             async with conn.transaction():
-                query = (f'UPDATE {table} {self._format_update_vars(values.keys())} '
-                         f'{self._format_select_vars(conditions.keys(), start=len(values) + 1)}')
                 try:
                     res = await conn.execute(query, *values. values(), *conditions.values())
                 except asyncpg.IntegrityConstraintViolationError:
@@ -180,16 +291,12 @@ class BaseDatabaseManager:
                                ColumnValueFormatter(values), ColumnValueFormatter(conditions))
         return self._parse_status(res)
 
-    async def _delete(self, table: str, **values) -> int:
+    async def _delete(self, table: str, *, lane: str = 'interactive', **values) -> int:
         assert not self.bot.db_closed
-        assert self.tables
-        assert table in self.tables
-        assert values
-        assert all(k in self.tables[table] for k in values.keys())
+        query = self._query('delete', table, conditions=tuple(values))
 
-        async with self.pool.acquire() as conn:
+        async with self._acquire(table, 'delete', query, lane=lane) as conn:
             async with conn.transaction():
-                query = f'DELETE FROM {table} {self._format_select_vars(values.keys())}'
                 try:
                     res = await conn.execute(query, *values.values())
                 except asyncpg.IntegrityConstraintViolationError:
@@ -198,3 +305,72 @@ class BaseDatabaseManager:
                 self.log.debug(f'Executed DELETE query in table {table} with parameters %s',
                                ColumnValueFormatter(values))
         return self._parse_status(res)
+
+    async def _insert_many(self, table: str, columns: 'tuple[str, ...]', records: 'Iterable[tuple]', *,
+                           lane: str = 'interactive') -> int:
+        """Inserts the records with a single COPY, returns the number of rows inserted."""
+        assert not self.bot.db_closed
+        assert table in self.tables
+        assert columns
+        assert all(k in self.tables[table] for k in columns)
+
+        records = list(records)
+        if not records:
+            return 0
+
+        conn: asyncpg.Connection
+        async with self._acquire(table, 'copy', lane=lane) as conn:
+            async with conn.transaction():
+                try:
+                    res = await conn.copy_records_to_table(table, records=records, columns=columns)
+                except asyncpg.IntegrityConstraintViolationError:
+                    self.log.error(f'Exception when inserting rows into table {table}', exc_info=True)
+                    return 0
+                self.log.debug(f'Executed COPY query in table {table} with %d rows', len(records))
+        return self._parse_status(res)
+
+    async def _upsert_many(self, table: str, columns: 'tuple[str, ...]', records: 'Iterable[tuple]', *,
+                           conflict: 'tuple[str, ...]', lane: str = 'interactive') -> int:
+        """Inserts the records in one transaction, rows that conflict on the given columns are updated instead.
+
+        Returns the number of records written."""
+        assert not self.bot.db_closed
+        query = self._query('upsert', table, columns=columns, conditions=conflict)
+
+        records = list(records)
+        if not records:
+            return 0
+
+        conn: asyncpg.Connection
+        async with self._acquire(table, 'upsert', query, lane=lane) as conn:
+            async with conn.transaction():
+                try:
+                    await conn.executemany(query, records)
+                except asyncpg.IntegrityConstraintViolationError:
+                    self.log.error(f'Exception when upserting rows into table {table}', exc_info=True)
+                    return 0
+                self.log.debug(f'Executed INSERT ON CONFLICT query in table {table} with %d rows', len(records))
+        return len(records)
+
+    async def _delete_many(self, table: str, columns: 'tuple[str, ...]', records: 'Iterable[tuple]', *,
+                           lane: str = 'interactive') -> int:
+        """Deletes the rows matching each record's values for the given columns in one transaction.
+
+        Returns the number of records processed."""
+        assert not self.bot.db_closed
+        query = self._query('delete', table, conditions=columns)
+
+        records = list(records)
+        if not records:
+            return 0
+
+        conn: asyncpg.Connection
+        async with self._acquire(table, 'delete', query, lane=lane) as conn:
+            async with conn.transaction():
+                try:
+                    await conn.executemany(query, records)
+                except asyncpg.IntegrityConstraintViolationError:
+                    self.log.error(f'Exception when deleting rows in table {table}', exc_info=True)
+                    return 0
+                self.log.debug(f'Executed DELETE query in table {table} with %d rows', len(records))
+        return len(records)
@@ -1,10 +1,11 @@
 from typing import TYPE_CHECKING, NamedTuple
 
+import asyncpg
+
 from .common import BaseDatabaseManager
 
 if TYPE_CHECKING:
     from typing import AsyncGenerator, Tuple, Optional
-    import asyncpg
 
 
 # I can't really think of a use for this... maybe I'll remove it if nothing happens.
@@ -27,9 +28,9 @@ class DatabaseChannel(NamedTuple):
 
 tables = {'flags': ['name', 'value'],
           'staff': ['user_id', 'position', 'console'],
-          'members': ['id', 'BIGINT', 'watched'],
+          'members': ['id', 'watched'],
           'channels': ['id', 'name', 'filtered', 'lock_level', 'mod_channel'],
-          'changedroles': ['role_id', 'channel_id', 'original_value'],
+          'changedroles': ['channel_id', 'role_id', 'original_value'],
           'roles': ['id', 'name'],
           'rules': ['id', 'description']}
 
@@ -40,7 +41,7 @@ class ConfigurationDatabaseManager(BaseDatabaseManager, tables=tables):
     async def add_member(self, member_id: int):
         query = "INSERT INTO members VALUES ($1) ON CONFLICT (id) DO NOTHING"
         conn: asyncpg.Connection
-        async with self.pool.acquire() as conn:
+        async with self._acquire('members', 'insert', query) as conn:
             async with conn.transaction():
                 return await conn.execute(query, member_id)
 
@@ -92,28 +93,67 @@ class ConfigurationDatabaseManager(BaseDatabaseManager, tables=tables):
         return await self._delete('staff', user_id=user_id)
 
     async def get_all_staff(self) -> 'AsyncGenerator[Tuple[int, str], None]':
-        async with self.pool.acquire() as conn:
+        query = "SELECT * FROM staff WHERE position != 'Helper'"
+        async with self._acquire('staff', 'select', query, lane='bulk', record=False) as conn:
             async with conn.transaction():
-                async for snowflake, position, _ in conn.cursor("SELECT * FROM staff WHERE position != 'Helper'"):
+                async for snowflake, position, _ in self._stream(conn, 'staff', 'select', query):
                     yield snowflake, position
 
     async def get_all_helpers(self) -> 'AsyncGenerator[Tuple[int, str], None]':
-        async with self.pool.acquire() as conn:
+        query = "SELECT * FROM staff WHERE console IS NOT NULL"
+        async with self._acquire('staff', 'select', query, lane='bulk', record=False) as conn:
             async with conn.transaction():
-                async for snowflake, _, console in conn.cursor("SELECT * FROM staff WHERE console IS NOT NULL"):
+                async for snowflake, _, console in self._stream(conn, 'staff', 'select', query):
                     yield snowflake, console
 
     async def add_channel(self, channel_id: int, name: str):
         return await self._insert('channels', id=channel_id, name=name)
 
+    async def _add_named_rows(self, table: str, records: 'list[tuple[int, str]]') -> int:
+        """Gives the rows that have the same name the new id and inserts the rest, in one transaction.
+
+        The existing rows keep their other columns. Returns the number of records written."""
+        assert not self.bot.db_closed
+        if not records:
+            return 0
+
+        names_query = f"SELECT name FROM {table} WHERE name = ANY($1::text[])"
+        update_query = self._query('update', table, columns=('id',), conditions=('name',))
+        insert_query = f"INSERT INTO {table} (id, name) VALUES ($1, $2) ON CONFLICT (id) DO NOTHING"
+
+        conn: asyncpg.Connection
+        async with self._acquire(table, 'upsert', insert_query, lane='bulk') as conn:
+            async with conn.transaction():
+                try:
+                    existing = {r[0] for r in await conn.fetch(names_query, [name for _, name in records])}
+                    updated = [(row_id, name) for row_id, name in records if name in existing]
+                    inserted = [(row_id, name) for row_id, name in records if name not in existing]
+                    if updated:
+                        await conn.executemany(update_query, updated)
+                    if inserted:
+                        await conn.executemany(insert_query, inserted)
+                except asyncpg.IntegrityConstraintViolationError:
+                    self.log.error(f'Exception when adding rows to table {table}', exc_info=True)
+                    return 0
+                self.log.debug(f'Updated %d rows and inserted %d rows in table {table}', len(updated), len(inserted))
+        return len(records)
+
+    async def add_channels(self, channels: 'list[tuple[int, str]]'):
+        """Adds the channels, the rows that have the same name get the new id."""
+        return await self._add_named_rows('channels', channels)
+
     async def get_channel(self, channel_id: int):
-        async for c in self._select('channels', id=channel_id):
+        for c in await self._fetch('channels', id=channel_id):
             return c
 
+    async def get_channels(self) -> 'list[tuple[int, str, bool, int, bool]]':
+        return await self._fetch('channels', lane='bulk')
+
     async def get_channel_by_name(self, name: str) -> 'Optional[tuple[int, str, bool, int, bool]]':
-        async with self.pool.acquire() as conn:
+        query = "SELECT * from channels WHERE name=$1"
+        async with self._acquire('channels', 'select', query) as conn:
             async with conn.transaction():
-                return await conn.fetchrow("SELECT * from channels WHERE name=$1", name)
+                return await conn.fetchrow(query, name)
 
     async def update_channel(self, channel_id: int, name: str):
         return await self._update('channels', {'id': channel_id}, name=name)
@@ -131,8 +171,15 @@ class ConfigurationDatabaseManager(BaseDatabaseManager, tables=tables):
     async def add_role(self, name: str, role_id: int):
         return await self._insert('roles', id=role_id, name=name)
 
+    async def add_roles(self, roles: 'list[tuple[int, str]]'):
+        """Adds the roles, the rows that have the same name get the new id."""
+        return await self._add_named_rows('roles', roles)
+
+    async def get_roles(self) -> 'list[tuple[int, str]]':
+        return await self._fetch('roles', lane='bulk')
+
     async def get_role(self, name: str) -> 'Optional[tuple[int, str]]':
-        async for role_id, name in self._select('roles', name=name):
+        for role_id, name in await self._fetch('roles', name=name):
             return role_id, name
         return None
 
@@ -140,22 +187,61 @@ class ConfigurationDatabaseManager(BaseDatabaseManager, tables=tables):
         await self._update('roles', {'id': role_id}, name=name)
 
     async def add_changed_roles(self, roles: 'list[tuple[int, Optional[bool]]]', channel_id: int):
-        query = "INSERT INTO changedroles VALUES ($1,$2, $3)"
-        values = []
-        for role_id, value in roles:
-            values.append((channel_id, role_id, value))
+        return await self._upsert_many('changedroles', ('channel_id', 'role_id', 'original_value'),
+                                       ((channel_id, role_id, value) for role_id, value in roles),
+                                       conflict=('channel_id', 'role_id'))
+
+    async def lock_channels(self, changes: 'dict[int, list[tuple[int, Optional[bool]]]]', lock_level: int) -> bool:
+        """Stores the changed roles and the lock level of the channels in one transaction, returns False if it failed."""
+        assert not self.bot.db_closed
+        roles_query = self._query('upsert', 'changedroles', columns=('channel_id', 'role_id', 'original_value'),
+                                  conditions=('channel_id', 'role_id'))
+        level_query = self._query('update', 'channels', columns=('lock_level',), conditions=('id',))
 
         conn: asyncpg.Connection
+        async with self._acquire('changedroles', 'upsert', roles_query, lane='bulk') as conn:
+            async with conn.transaction():
+                try:
+                    await conn.executemany(roles_query, [(channel_id, role_id, value)
+                                                         for channel_id, roles in changes.items()
+                                                         for role_id, value in roles])
+                    await conn.executemany(level_query, [(lock_level, channel_id) for channel_id in changes])
+                except asyncpg.IntegrityConstraintViolationError:
+                    self.log.error('Exception when locking channels', exc_info=True)
+                    return False
+                self.log.debug('Locked %d channels with lock level %d', len(changes), lock_level)
+        return True
+
+    async def unlock_channels(self, channel_ids: 'list[int]') -> bool:
+        """Clears the changed roles and the lock level of the channels in one transaction, returns False if it failed."""
+        assert not self.bot.db_closed
+        roles_query = self._query('delete', 'changedroles', conditions=('channel_id',))
+        level_query = self._query('update', 'channels', columns=('lock_level',), conditions=('id',))
 
-        async with self.pool.acquire() as conn:
+        conn: asyncpg.Connection
+        async with self._acquire('changedroles', 'delete', roles_query, lane='bulk') as conn:
             async with conn.transaction():
-                await conn.executemany(query, values)
+                try:
+                    await conn.executemany(roles_query, [(channel_id,) for channel_id in channel_ids])
+                    await conn.executemany(level_query, [(0, channel_id) for channel_id in channel_ids])
+                except asyncpg.IntegrityConstraintViolationError:
+                    self.log.error('Exception when unlocking channels', exc_info=True)
+                    return False
+                self.log.debug('Unlocked %d channels', len(channel_ids))
+        return True
+
+    async def get_channels_by_id(self, channel_ids: 'list[int]') -> 'list[tuple[int, str, bool, int, bool]]':
+        return await self._fetch_any('channels', 'id', channel_ids)
+
+    async def get_changed_roles_many(self, channel_ids: 'list[int]') -> 'list[ChangedRole]':
+        return [ChangedRole(channel_id=cr[0], role_id=cr[1], original_value=cr[2])
+                for cr in await self._fetch_any('changedroles', 'channel_id', channel_ids)]
 
     async def delete_changed_role(self, role_id: int, channel_id: int):
         return await self._delete('changedroles', role_id=role_id, channel_id=channel_id)
 
     async def get_changed_roles(self, channel_id: int) -> 'AsyncGenerator[ChangedRole, None]':
-        async for cr in self._select('changedroles', channel_id=channel_id):
+        for cr in await self._fetch('changedroles', channel_id=channel_id):
             yield ChangedRole(channel_id=cr[0], role_id=cr[1], original_value=cr[2])
 
     async def clear_changed_roles(self, channel_id: int):
@@ -153,7 +153,7 @@ class ExtrasDatabaseManager(BaseDatabaseManager, tables=tables):
                                   options=options, start=start, staff_only=staff_only)
 
     async def get_voteviews(self, identifier) -> 'AsyncGenerator[tuple[int, int, str, int, str, datetime, bool], None]':
-        async for vv in self._select('voteviews', identifier=identifier):
+        for vv in await self._fetch('voteviews', identifier=identifier):
             yield vv
 
     async def delete_voteview(self, view_id: int) -> int:
@@ -164,7 +164,7 @@ class ExtrasDatabaseManager(BaseDatabaseManager, tables=tables):
 
         query = "INSERT INTO votes VALUES($1,$2,$3) ON CONFLICT (view_id, voter_id) DO UPDATE SET option=excluded.option"
         conn: asyncpg.Connection
-        async with self.pool.acquire() as conn:
+        async with self._acquire('votes', 'upsert', query) as conn:
             async with conn.transaction():
                 res = await conn.execute(query, view_id, voter_id, option)
         return self._parse_status(res)
@@ -173,7 +173,7 @@ class ExtrasDatabaseManager(BaseDatabaseManager, tables=tables):
         await self._update('voteviews', {'option': option}, view_id=view_id, voter_id=voter_id)
 
     async def get_votes(self, view_id: int) -> 'AsyncGenerator[Vote, None]':
-        async for v in self._select('votes', view_id=view_id):
+        for v in await self._fetch('votes', view_id=view_id):
             yield Vote(view_id=v[0], voter_id=v[1], option=v[2])
 
     async def add_citizen(self, citizen_id: int) -> int:
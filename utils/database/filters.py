@@ -36,7 +36,7 @@ class ApprovedInvite(NamedTuple):
 
 
 tables = {'filteredwords': ['word', 'kind'],
-          'levenshteinwords': ['word', 'threshold', 'kind'],
+          'levenshteinwords': ['word', 'threshold', 'kind', 'whitelisted'],
           'whitelistedwords': ['word'],
           'approvedinvites': ['code', 'uses', 'alias']
           }
@@ -88,6 +88,6 @@ class FiltersDatabaseManager(BaseDatabaseManager, tables=tables):
     async def update_invite_use(self, code: str):
         query = "UPDATE approvedinvites SET uses=uses-1 WHERE code=$1"
         conn: asyncpg.Connection
-        async with self.pool.acquire() as conn:
+        async with self._acquire('approvedinvites', 'update', query) as conn:
             async with conn.transaction():
                 return await conn.execute(query, code)
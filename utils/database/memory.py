@@ -0,0 +1,488 @@
+import re
+
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter
+from typing import TYPE_CHECKING, NamedTuple
+
+from discord.utils import time_snowflake
+
+from .common import DatabaseManagerError
+from .configuration import ConfigurationDatabaseManager, tables as configuration_tables
+from .extras import ExtrasDatabaseManager, tables as extras_tables
+from .filters import FiltersDatabaseManager, tables as filters_tables
+from .restrictions import RestrictionsDatabaseManager, tables as restrictions_tables
+from .stats import query_stats
+from .warns import WarnsDatabaseManager, tables as warns_tables
+
+if TYPE_CHECKING:
+    from typing import AsyncGenerator, AsyncIterator, Iterable, Iterator, Optional, Tuple, Type
+    from kurisu import Kurisu
+    from .common import BaseDatabaseManager, Tables
+
+# The memory tables are built from schema.sql, so their columns are in the same order as in PostgreSQL
+schema_path = Path(__file__).resolve().parents[2] / 'schema.sql'
+
+_table_re = re.compile(r'create table (\w+)\s*\((.*?)\n\);', re.IGNORECASE | re.DOTALL)
+_key_re = re.compile(r'(PRIMARY KEY|UNIQUE)\s*\(([^)]*)\)', re.IGNORECASE)
+_default_re = re.compile(r'DEFAULT (\S+)', re.IGNORECASE)
+
+
+class TableSchema(NamedTuple):
+    columns: 'list[str]'
+    defaults: 'dict[str, object]'
+    unique_keys: 'list[tuple[str, ...]]'
+
+
+def _parse_default(value: str) -> object:
+    if value.upper() in ('TRUE', 'FALSE'):
+        return value.upper() == 'TRUE'
+    return int(value)
+
+
+def parse_schema(sql: str) -> 'dict[str, TableSchema]':
+    """Reads the columns, defaults and unique keys of the tables in a schema. Foreign keys are not read."""
+    schema = {}
+    for name, body in _table_re.findall(sql):
+        table = schema[name] = TableSchema([], {}, [])
+        for line in body.splitlines():
+            line = line.strip().rstrip(',')
+            if not line:
+                continue
+            if key := _key_re.fullmatch(line):
+                table.unique_keys.append(tuple(c.strip() for c in key[2].split(',')))
+                continue
+            column = line.split()[0]
+            table.columns.append(column)
+            upper = line.upper()
+            if 'PRIMARY KEY' in upper or 'UNIQUE' in upper:
+                table.unique_keys.append((column,))
+            if default := _default_re.search(line):
+                table.defaults[column] = _parse_default(default[1])
+    return schema
+
+
+class UniqueViolationError(DatabaseManagerError):
+    """A row has the same values as another row for a unique key."""
+
+
+class MemoryTable:
+    """The rows of a table, with an index for each unique key."""
+
+    def __init__(self, name: str, schema: TableSchema):
+        self.name = name
+        self.columns = schema.columns
+        self.positions = {c: n for n, c in enumerate(self.columns)}
+        self.defaults = schema.defaults
+        self.unique_keys = schema.unique_keys
+        # Row ids keep the insertion order, like a table that was never vacuumed
+        self.rows: 'dict[int, tuple]' = {}
+        self.indexes: 'list[dict[tuple, int]]' = [{} for _ in self.unique_keys]
+        self._next_id = 0
+
+    def make_row(self, values: dict, base: 'Optional[tuple]' = None) -> tuple:
+        if base is None:
+            return tuple(values[c] if c in values else self.defaults.get(c) for c in self.columns)
+        return tuple(values[c] if c in values else base[n] for n, c in enumerate(self.columns))
+
+    def _key(self, key: 'tuple[str, ...]', row: tuple) -> 'Optional[tuple]':
+        value = tuple(row[self.positions[c]] for c in key)
+        # NULLs never conflict
+        return None if None in value else value
+
+    def find(self, conditions: dict) -> 'list[int]':
+        """Returns the ids of the rows matching the conditions, using a unique key index if they cover one."""
+        for key, index in zip(self.unique_keys, self.indexes):
+            if all(c in conditions for c in key):
+                row_id = index.get(tuple(conditions[c] for c in key))
+                if row_id is None:
+                    return []
+                row = self.rows[row_id]
+                return [row_id] if all(row[self.positions[c]] == v for c, v in conditions.items()) else []
+        return [row_id for row_id, row in self.rows.items()
+                if all(row[self.positions[c]] == v for c, v in conditions.items())]
+
+    def conflict(self, row: tuple, ignore: 'Optional[int]' = None) -> 'Optional[int]':
+        """Returns the id of a row with the same values for a unique key, if there is one."""
+        for key, index in zip(self.unique_keys, self.indexes):
+            value = self._key(key, row)
+            if value is not None and index.get(value, ignore) != ignore:
+                return index[value]
+        return None
+
+    def insert(self, row: tuple) -> int:
+        if self.conflict(row) is not None:
+            raise UniqueViolationError(f'Duplicate key in table {self.name}: {row}')
+        row_id = self._next_id
+        self._next_id += 1
+        self.rows[row_id] = row
+        self._index(row_id, row)
+        return row_id
+
+    def replace(self, row_id: int, row: tuple):
+        if self.conflict(row, ignore=row_id) is not None:
+            raise UniqueViolationError(f'Duplicate key in table {self.name}: {row}')
+        self._unindex(self.rows[row_id])
+        self.rows[row_id] = row
+        self._index(row_id, row)
+
+    def remove(self, row_id: int):
+        self._unindex(self.rows.pop(row_id))
+
+    def _index(self, row_id: int, row: tuple):
+        for key, index in zip(self.unique_keys, self.indexes):
+            value = self._key(key, row)
+            if value is not None:
+                index[value] = row_id
+
+    def _unindex(self, row: tuple):
+        for key, index in zip(self.unique_keys, self.indexes):
+            value = self._key(key, row)
+            if value is not None:
+                del index[value]
+
+    @contextmanager
+    def transaction(self) -> 'Iterator[None]':
+        """Restores the rows if the block raises."""
+        rows = self.rows.copy()
+        indexes = [index.copy() for index in self.indexes]
+        try:
+            yield
+        except BaseException:
+            self.rows = rows
+            self.indexes = indexes
+            raise
+
+
+class MemoryDatabase:
+    """Keeps the tables in memory, so the bot and the benchmarks can run without PostgreSQL.
+
+    Nothing is persisted and only the primary keys and unique constraints of schema.sql are enforced."""
+
+    def __init__(self):
+        self.schema = parse_schema(schema_path.read_text())
+        self.tables: 'dict[str, MemoryTable]' = {}
+
+    def table(self, name: str) -> MemoryTable:
+        try:
+            return self.tables[name]
+        except KeyError:
+            table = self.tables[name] = MemoryTable(name, self.schema[name])
+            return table
+
+
+class MemoryBackend:
+    """Implements the BaseDatabaseManager query helpers over the bot's MemoryDatabase.
+
+    Goes before the database manager in the bases, methods that write their own SQL must be overridden."""
+
+    bot: 'Kurisu'
+    tables: 'Tables'
+
+    def __init__(self, bot: 'Kurisu'):
+        super().__init__(bot)
+        self.memory: MemoryDatabase = bot.memory_database
+        for table, columns in self.tables.items():
+            if columns != self.memory.schema[table].columns:
+                raise DatabaseManagerError(f'The columns of table {table} in {type(self).__name__} are {columns}, '
+                                           f'schema.sql has {self.memory.schema[table].columns}')
+
+    def _table(self, table: str) -> MemoryTable:
+        return self.memory.table(table)
+
+    @contextmanager
+    def _timed(self, table: str, operation: str, query: str) -> 'Iterator[None]':
+        """Records the query like _acquire does, so the statistics are comparable with PostgreSQL."""
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            query_stats.record(table, operation, perf_counter() - start, query)
+
+    @asynccontextmanager
+    async def _acquire(self, table: str, operation: str, query: 'Optional[str]' = None, *,
+                       lane: str = 'interactive', record: bool = True) -> 'AsyncIterator[None]':
+        raise DatabaseManagerError(f'{type(self).__name__} has no connections, '
+                                   f'the {operation} on table {table} needs an in-memory implementation')
+        yield
+
+    async def _select(self, table: str, *, lane: str = 'bulk', **values) -> 'AsyncGenerator[tuple, None]':
+        for row in await self._fetch(table, lane=lane, **values):
+            yield row
+
+    async def _fetch(self, table: str, *, lane: str = 'interactive', **values) -> 'list[tuple]':
+        assert not self.bot.db_closed
+        query = self._query('select', table, conditions=tuple(values))
+        memory_table = self._table(table)
+        with self._timed(table, 'select', query):
+            return [memory_table.rows[row_id] for row_id in memory_table.find(values)]
+
+    async def _fetch_any(self, table: str, column: str, values: 'Iterable', *,
+                         lane: str = 'interactive') -> 'list[tuple]':
+        assert not self.bot.db_closed
+        query = self._query('select_any', table, conditions=(column,))
+        memory_table = self._table(table)
+        position = memory_table.positions[column]
+        values = set(values)
+        with self._timed(table, 'select', query):
+            return [row for row in memory_table.rows.values() if row[position] in values]
+
+    async def _select_one(self, table: str, *, lane: str = 'interactive', **values) -> 'Optional[tuple]':
+        for row in await self._fetch(table, lane=lane, **values):
+            return row
+        return None
+
+    async def _row_count(self, table: str, *, lane: str = 'interactive', **values) -> int:
+        assert not self.bot.db_closed
+        query = self._query('count', table, conditions=tuple(values))
+        with self._timed(table, 'count', query):
+            return len(self._table(table).find(values))
+
+    async def _insert(self, table: str, *, lane: str = 'interactive', **values) -> int:
+        assert not self.bot.db_closed
+        query = self._query('insert', table, columns=tuple(values))
+        memory_table = self._table(table)
+        with self._timed(table, 'insert', query):
+            try:
+                memory_table.insert(memory_table.make_row(values))
+            except UniqueViolationError:
+                self.log.error(f'Exception when inserting values into table {table}', exc_info=True)
+                return 0
+        return 1
+
+    async def _update(self, table: str, values: dict, *, lane: str = 'interactive', **conditions) -> int:
+        assert not self.bot.db_closed
+        query = self._query('update', table, columns=tuple(values), conditions=tuple(conditions))
+        memory_table = self._table(table)
+        with self._timed(table, 'update', query):
+            row_ids = memory_table.find(conditions)
+            try:
+                with memory_table.transaction():
+                    for row_id in row_ids:
+                        memory_table.replace(row_id, memory_table.make_row(values, memory_table.rows[row_id]))
+            except UniqueViolationError:
+                self.log.error(f'Exception when updating values in table {table}', exc_info=True)
+                return False
+        return len(row_ids)
+
+    async def _delete(self, table: str, *, lane: str = 'interactive', **values) -> int:
+        assert not self.bot.db_closed
+        query = self._query('delete', table, conditions=tuple(values))
+        memory_table = self._table(table)
+        with self._timed(table, 'delete', query):
+            row_ids = memory_table.find(values)
+            for row_id in row_ids:
+                memory_table.remove(row_id)
+        return len(row_ids)
+
+    async def _insert_many(self, table: str, columns: 'tuple[str, ...]', records: 'Iterable[tuple]', *,
+                           lane: str = 'interactive') -> int:
+        assert not self.bot.db_closed
+        assert table in self.tables
+        assert columns
+        assert all(k in self.tables[table] for k in columns)
+
+        records = list(records)
+        if not records:
+            return 0
+
+        memory_table = self._table(table)
+        with self._timed(table, 'copy', f'COPY {table}'):
+            try:
+                with memory_table.transaction():
+                    for record in records:
+                        memory_table.insert(memory_table.make_row(dict(zip(columns, record))))
+            except UniqueViolationError:
+                self.log.error(f'Exception when inserting rows into table {table}', exc_info=True)
+                return 0
+        return len(records)
+
+    async def _upsert_many(self, table: str, columns: 'tuple[str, ...]', records: 'Iterable[tuple]', *,
+                           conflict: 'tuple[str, ...]', lane: str = 'interactive') -> int:
+        assert not self.bot.db_closed
+        query = self._query('upsert', table, columns=columns, conditions=conflict)
+
+        records = list(records)
+        if not records:
+            return 0
+
+        memory_table = self._table(table)
+        with self._timed(table, 'upsert', query):
+            try:
+                with memory_table.transaction():
+                    for record in records:
+                        values = dict(zip(columns, record))
+                        for row_id in memory_table.find({c: values[c] for c in conflict}):
+                            memory_table.replace(row_id, memory_table.make_row(values, memory_table.rows[row_id]))
+                            break
+                        else:
+                            memory_table.insert(memory_table.make_row(values))
+            except UniqueViolationError:
+                self.log.error(f'Exception when upserting rows into table {table}', exc_info=True)
+                return 0
+        return len(records)
+
+    async def _delete_many(self, table: str, columns: 'tuple[str, ...]', records: 'Iterable[tuple]', *,
+                           lane: str = 'interactive') -> int:
+        assert not self.bot.db_closed
+        query = self._query('delete', table, conditions=columns)
+
+        records = list(records)
+        if not records:
+            return 0
+
+        memory_table = self._table(table)
+        with self._timed(table, 'delete', query):
+            for record in records:
+                for row_id in memory_table.find(dict(zip(columns, record))):
+                    memory_table.remove(row_id)
+        return len(records)
+
+
+class MemoryConfigurationDatabaseManager(MemoryBackend, ConfigurationDatabaseManager, tables=configuration_tables):
+
+    async def add_member(self, member_id: int):
+        return await self._upsert_many('members', ('id',), [(member_id,)], conflict=('id',))
+
+    async def get_all_staff(self) -> 'AsyncGenerator[Tuple[int, str], None]':
+        async for snowflake, position, _ in self._select('staff'):
+            if position != 'Helper':
+                yield snowflake, position
+
+    async def get_all_helpers(self) -> 'AsyncGenerator[Tuple[int, str], None]':
+        async for snowflake, _, console in self._select('staff'):
+            if console is not None:
+                yield snowflake, console
+
+    async def get_channel_by_name(self, name: str) -> 'Optional[tuple[int, str, bool, int, bool]]':
+        return await self._select_one('channels', name=name)
+
+    async def _add_named_rows(self, table: str, records: 'list[tuple[int, str]]') -> int:
+        memory_table = self._table(table)
+        try:
+            with memory_table.transaction():
+                for row_id, name in records:
+                    for existing in memory_table.find({'name': name}):
+                        memory_table.replace(existing, memory_table.make_row({'id': row_id}, memory_table.rows[existing]))
+                        break
+                    else:
+                        if not memory_table.find({'id': row_id}):
+                            memory_table.insert(memory_table.make_row({'id': row_id, 'name': name}))
+        except UniqueViolationError:
+            self.log.error(f'Exception when adding rows to table {table}', exc_info=True)
+            return 0
+        return len(records)
+
+    async def lock_channels(self, changes: 'dict[int, list[tuple[int, Optional[bool]]]]', lock_level: int) -> bool:
+        changed_roles, channels = self._table('changedroles'), self._table('channels')
+        with self._timed('changedroles', 'upsert', 'lock_channels'):
+            try:
+                with changed_roles.transaction(), channels.transaction():
+                    for channel_id, roles in changes.items():
+                        for role_id, value in roles:
+                            row = changed_roles.make_row({'channel_id': channel_id, 'role_id': role_id,
+                                                          'original_value': value})
+                            for existing in changed_roles.find({'channel_id': channel_id, 'role_id': role_id}):
+                                changed_roles.replace(existing, row)
+                                break
+                            else:
+                                changed_roles.insert(row)
+                        for row_id in channels.find({'id': channel_id}):
+                            channels.replace(row_id, channels.make_row({'lock_level': lock_level}, channels.rows[row_id]))
+            except UniqueViolationError:
+                self.log.error('Exception when locking channels', exc_info=True)
+                return False
+        return True
+
+    async def unlock_channels(self, channel_ids: 'list[int]') -> bool:
+        changed_roles, channels = self._table('changedroles'), self._table('channels')
+        with self._timed('changedroles', 'delete', 'unlock_channels'):
+            for channel_id in channel_ids:
+                for row_id in changed_roles.find({'channel_id': channel_id}):
+                    changed_roles.remove(row_id)
+                for row_id in channels.find({'id': channel_id}):
+                    channels.replace(row_id, channels.make_row({'lock_level': 0}, channels.rows[row_id]))
+        return True
+
+
+class MemoryExtrasDatabaseManager(MemoryBackend, ExtrasDatabaseManager, tables=extras_tables):
+
+    async def add_vote(self, view_id: int, voter_id: int, option: str) -> int:
+        await self.bot.configuration.add_member(voter_id)
+        return await self._upsert_many('votes', ('view_id', 'voter_id', 'option'), [(view_id, voter_id, option)],
+                                       conflict=('view_id', 'voter_id'))
+
+
+class MemoryFiltersDatabaseManager(MemoryBackend, FiltersDatabaseManager, tables=filters_tables):
+
+    async def update_invite_use(self, code: str):
+        invite = await self._select_one('approvedinvites', code=code)
+        if invite:
+            return await self._update('approvedinvites', {'uses': invite[1] - 1}, code=code)
+        return 0
+
+
+class MemoryRestrictionsDatabaseManager(MemoryBackend, RestrictionsDatabaseManager, tables=restrictions_tables):
+
+    async def add_restriction(self, restriction_id: int, user_id: int, restriction: str) -> int:
+        await self.bot.configuration.add_member(user_id)
+        if await self._select_one('restrictions', user_id=user_id, type=restriction):
+            return await self._update('restrictions', {'end_date': None}, user_id=user_id, type=restriction)
+        return await self._insert('restrictions', id=restriction_id, user_id=user_id, type=restriction)
+
+    async def add_timed_restriction(self, restriction_id: int, user_id: int, restriction: str, end_date: datetime) -> int:
+        await self.bot.configuration.add_member(user_id)
+        if await self._select_one('restrictions', user_id=user_id, type=restriction):
+            return await self._update('restrictions', {'end_date': end_date}, user_id=user_id, type=restriction)
+        return await self._insert('restrictions', id=restriction_id, user_id=user_id, type=restriction,
+                                  end_date=end_date)
+
+    async def get_timed_restrictions(self) -> 'AsyncGenerator[tuple[int, int, str, datetime, bool], None]':
+        async for r in self._select('restrictions'):
+            if r[3] is not None:
+                yield r
+
+
+class MemoryWarnsDatabaseManager(MemoryBackend, WarnsDatabaseManager, tables=warns_tables):
+
+    async def add_warning(self, user_id: int, issuer: int, reason: 'Optional[str]') -> 'Tuple[int, int]':
+        await self.bot.configuration.add_member(user_id)
+        now = time_snowflake(datetime.now())
+        await self._insert('warns', id=now, user_id=user_id, issuer_id=issuer, reason=reason)
+        return now, await self._row_count('warns', user_id=user_id)
+
+    async def get_all_warnings_count(self) -> 'AsyncGenerator[Tuple[int, int], None]':
+        counts = Counter([w[1] async for w in self._select('warns')])
+        for user_id, count in counts.items():
+            yield user_id, count
+
+    async def delete_warning(self, warn_id: int) -> 'Optional[int]':
+        warn = await self._select_one('warns', id=warn_id)
+        if warn and await self._delete('warns', id=warn_id):
+            return warn[1]
+        return None
+
+    async def copy_all_warnings(self, origin: int, destination: int):
+        await self.bot.configuration.add_member(destination)
+        assert (await self.get_warnings_count(origin)) + (await self.get_warnings_count(destination)) <= 5
+
+        copied = 0
+        async for w in self.get_warnings(origin):
+            warn_id = w.warn_id + 1
+            while await self._select_one('warns', id=warn_id):
+                warn_id += 1
+            copied += await self._insert('warns', id=warn_id, user_id=destination, issuer_id=w.issuer_id,
+                                         reason=w.reason)
+        return copied
+
+
+# The in-memory counterpart of each database manager, used by BaseManager when the bot has a MemoryDatabase
+memory_managers: 'dict[Type[BaseDatabaseManager], Type[BaseDatabaseManager]]' = {
+    ConfigurationDatabaseManager: MemoryConfigurationDatabaseManager,
+    ExtrasDatabaseManager: MemoryExtrasDatabaseManager,
+    FiltersDatabaseManager: MemoryFiltersDatabaseManager,
+    RestrictionsDatabaseManager: MemoryRestrictionsDatabaseManager,
+    WarnsDatabaseManager: MemoryWarnsDatabaseManager,
+}
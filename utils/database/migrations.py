@@ -0,0 +1,101 @@
+from typing import TYPE_CHECKING, NamedTuple
+
+import logging
+
+if TYPE_CHECKING:
+    import asyncpg
+
+
+logger = logging.getLogger(__name__)
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    statements: tuple[str, ...]
+
+
+# Append new migrations at the end with the next version, applied migrations must never be edited.
+migrations = (
+    Migration(1, 'Index warns by user', (
+        'CREATE INDEX IF NOT EXISTS warns_user_id_idx ON warns (user_id)',
+    )),
+    Migration(2, 'Index restrictions by type and end date', (
+        'CREATE INDEX IF NOT EXISTS restrictions_type_idx ON restrictions (type)',
+        'CREATE INDEX IF NOT EXISTS restrictions_end_date_idx ON restrictions (end_date) WHERE end_date IS NOT NULL',
+    )),
+    Migration(3, 'Index timed roles by expiring date', (
+        'CREATE INDEX IF NOT EXISTS timedroles_expiring_date_idx ON timedroles (expiring_date)',
+    )),
+    Migration(4, 'Index reminders by date and author', (
+        'CREATE INDEX IF NOT EXISTS reminders_reminder_date_idx ON reminders (reminder_date)',
+        'CREATE INDEX IF NOT EXISTS reminders_author_id_idx ON reminders (author_id)',
+    )),
+    Migration(5, 'Index channels by name', (
+        'CREATE INDEX IF NOT EXISTS channels_name_idx ON channels (name)',
+    )),
+    Migration(6, 'Notify changes to the cached tables', (
+        # The trigger arguments are the columns that identify a row, only those are sent
+        '''CREATE OR REPLACE FUNCTION notify_change() RETURNS trigger AS $$
+        DECLARE
+            old_key jsonb;
+            new_key jsonb;
+            col text;
+        BEGIN
+            IF TG_OP <> 'INSERT' THEN
+                old_key := '{}';
+                FOREACH col IN ARRAY TG_ARGV LOOP
+                    old_key := old_key || jsonb_build_object(col, to_jsonb(OLD) -> col);
+                END LOOP;
+            END IF;
+            IF TG_OP <> 'DELETE' THEN
+                new_key := '{}';
+                FOREACH col IN ARRAY TG_ARGV LOOP
+                    new_key := new_key || jsonb_build_object(col, to_jsonb(NEW) -> col);
+                END LOOP;
+            END IF;
+            PERFORM pg_notify('kurisu_changes', jsonb_build_object(
+                'source', current_setting('application_name'), 'table', TG_TABLE_NAME,
+                'old', old_key, 'new', new_key)::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql''',
+        *(statement
+          for table, key in (('filteredwords', "'word'"), ('levenshteinwords', "'word'"), ('whitelistedwords', "'word'"),
+                             ('approvedinvites', "'code'"), ('staff', "'user_id'"), ('flags', "'name'"),
+                             ('rules', "'id'"), ('channels', "'id'"), ('members', "'id'"), ('restrictions', "'id'"),
+                             ('softbans', "'user_id'"), ('tags', "'title'"), ('timedroles', "'role_id', 'user_id'"),
+                             ('reminders', "'id'"))
+          for statement in (f'DROP TRIGGER IF EXISTS {table}_notify ON {table}',
+                            f'CREATE TRIGGER {table}_notify AFTER INSERT OR UPDATE OR DELETE ON {table} '
+                            f'FOR EACH ROW EXECUTE FUNCTION notify_change({key})')),
+    )),
+    Migration(7, 'Notify changes to warns', (
+        # The user id is part of the key so the count of the user can be updated when a warn is deleted
+        'DROP TRIGGER IF EXISTS warns_notify ON warns',
+        "CREATE TRIGGER warns_notify AFTER INSERT OR UPDATE OR DELETE ON warns "
+        "FOR EACH ROW EXECUTE FUNCTION notify_change('id', 'user_id')",
+    )),
+)
+
+
+async def migrate(pool: 'asyncpg.Pool') -> int:
+    """Applies the migrations newer than the database schema version, returns the resulting version.
+
+    The migrations are applied in a single transaction, if one fails the schema is left untouched."""
+    conn: asyncpg.Connection
+    async with pool.acquire() as conn:
+        await conn.execute('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)')
+        async with conn.transaction():
+            # Keeps a second instance from applying the same migrations at the same time
+            await conn.execute('LOCK TABLE schema_version IN EXCLUSIVE MODE')
+            version = await conn.fetchval('SELECT MAX(version) FROM schema_version') or 0
+            for migration in migrations:
+                if migration.version <= version:
+                    continue
+                for statement in migration.statements:
+                    await conn.execute(statement)
+                await conn.execute('INSERT INTO schema_version VALUES ($1)', migration.version)
+                logger.info('Applied migration %d: %s', migration.version, migration.description)
+                version = migration.version
+    return version
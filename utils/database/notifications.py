@@ -0,0 +1,141 @@
+import asyncio
+import json
+import logging
+
+from typing import TYPE_CHECKING
+from uuid import uuid4
+
+if TYPE_CHECKING:
+    from typing import Awaitable, Callable, Optional
+    import asyncpg
+    from .common import BaseDatabaseManager
+    # Called with the key of the changed row and the row as it is now, or None if it no longer exists
+    ChangeHandler = Callable[[dict, Optional[asyncpg.Record]], None]
+
+
+logger = logging.getLogger(__name__)
+
+# Sent as the application_name of every pooled connection, the triggers include it in their notifications
+instance_name = f'kurisu-{uuid4().hex[:12]}'
+
+
+class ChangeListener:
+    """Receives the row changes notified by the table triggers and applies them to the subscribed caches.
+
+    Changes made by this instance are skipped, its managers already applied them.
+    If the connection is lost it listens again on a new one and the subscribed caches are reloaded.
+    Without a pool, when the bot uses the in-memory database, there is nothing to listen to."""
+
+    channel = 'kurisu_changes'
+    # Seconds between reconnection attempts, doubled after each failure
+    reconnect_delay = 1
+    max_reconnect_delay = 60
+
+    def __init__(self, pool: 'Optional[asyncpg.Pool]'):
+        self.pool = pool
+        self._conn: 'Optional[asyncpg.Connection]' = None
+        self._subscriptions: 'dict[str, tuple[BaseDatabaseManager, ChangeHandler]]' = {}
+        self._reloads: 'list[Callable[[], Awaitable]]' = []
+        # Changes are applied one at a time in the order they were committed
+        # None is queued after a reconnect, to reload the caches
+        self._queue: 'asyncio.Queue[Optional[dict]]' = asyncio.Queue()
+        self._task: 'Optional[asyncio.Task]' = None
+        self._reconnect_task: 'Optional[asyncio.Task]' = None
+        self.applied = 0
+        self.reconnects = 0
+
+    def subscribe(self, table: str, db: 'BaseDatabaseManager', handler: 'ChangeHandler'):
+        """Calls the handler for every change to the table made by another instance or by hand."""
+        self._subscriptions[table] = (db, handler)
+
+    def add_reload(self, reload: 'Callable[[], Awaitable]'):
+        """Runs the coroutine function after reconnecting, to load the caches the missed changes would have updated."""
+        self._reloads.append(reload)
+
+    async def start(self, after: 'Optional[Callable[[], Awaitable]]' = None):
+        """Starts listening. The changes received before the after coroutine finishes are applied once it does."""
+        if self.pool is None:
+            return
+        await self._listen()
+        self._task = asyncio.create_task(self._apply_changes(after))
+
+    async def stop(self):
+        for task in (self._task, self._reconnect_task):
+            if task:
+                task.cancel()
+        if self._conn:
+            self._conn.remove_termination_listener(self._terminated)
+            if not self._conn.is_closed():
+                await self._conn.remove_listener(self.channel, self._notified)
+            await self.pool.release(self._conn)
+            self._conn = None
+
+    async def _listen(self):
+        conn = await self.pool.acquire()
+        try:
+            await conn.add_listener(self.channel, self._notified)
+        except BaseException:
+            await self.pool.release(conn)
+            raise
+        conn.add_termination_listener(self._terminated)
+        self._conn = conn
+
+    def _terminated(self, conn: 'asyncpg.Connection'):
+        logger.warning('Lost the connection listening to %s, reconnecting', self.channel)
+        self._reconnect_task = asyncio.create_task(self._reconnect(conn))
+
+    async def _reconnect(self, conn: 'asyncpg.Connection'):
+        self._conn = None
+        # The pool replaces the closed connection
+        await self.pool.release(conn)
+        delay = self.reconnect_delay
+        while True:
+            try:
+                await self._listen()
+            except Exception:
+                logger.warning('Failed to listen to %s again, retrying in %ds', self.channel, delay, exc_info=True)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+            else:
+                break
+        self.reconnects += 1
+        # The changes made while disconnected were never notified, the caches are loaded again after the queued changes
+        self._queue.put_nowait(None)
+
+    def _notified(self, conn: 'asyncpg.Connection', pid: int, channel: str, payload: str):
+        change = json.loads(payload)
+        if change['source'] != instance_name and change['table'] in self._subscriptions:
+            self._queue.put_nowait(change)
+
+    async def _apply_changes(self, after: 'Optional[Callable[[], Awaitable]]'):
+        if after is not None:
+            # The caches the changes apply to are still loading
+            await after()
+        while True:
+            change = await self._queue.get()
+            if change is None:
+                await self._reload()
+                continue
+            try:
+                await self._apply(change)
+            except Exception:
+                logger.exception('Failed to apply a change to table %s', change['table'])
+
+    async def _reload(self):
+        results = await asyncio.gather(*(reload() for reload in self._reloads), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error('Failed to reload a cache after reconnecting', exc_info=result)
+        logger.info('Listening to %s again, reloaded %d caches', self.channel, len(self._reloads))
+
+    async def _apply(self, change: dict):
+        table = change['table']
+        db, handler = self._subscriptions[table]
+        old, new = change['old'], change['new']
+        if old is not None and old != new:
+            handler(old, None)
+        if new is not None:
+            # The row is read again instead of sent in the notification, payloads have a size limit
+            handler(new, await db.get_row(table, **new))
+        self.applied += 1
+        logger.debug('Applied change to table %s: %s -> %s', table, old, new)
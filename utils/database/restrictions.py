@@ -24,7 +24,7 @@ class RestrictionsDatabaseManager(BaseDatabaseManager, tables=tables):
         query = "INSERT INTO restrictions (id, user_id, type) VALUES ($1,$2,$3) ON CONFLICT (user_id, type) " \
                 "DO UPDATE SET end_date = NULL"
         conn: asyncpg.Connection
-        async with self.pool.acquire() as conn:
+        async with self._acquire('restrictions', 'upsert', query) as conn:
             async with conn.transaction():
                 res = await conn.execute(query, restriction_id, user_id, restriction)
         if res:
@@ -38,7 +38,7 @@ class RestrictionsDatabaseManager(BaseDatabaseManager, tables=tables):
         query = "INSERT INTO restrictions (id, user_id, type, end_date) VALUES ($1,$2,$3, $4) ON CONFLICT (user_id, type) " \
                 "DO UPDATE SET end_date = excluded.end_date"
         conn: asyncpg.Connection
-        async with self.pool.acquire() as conn:
+        async with self._acquire('restrictions', 'upsert', query) as conn:
             async with conn.transaction():
                 res = await conn.execute(query, restriction_id, user_id, restriction, end_date)
                 self.log.debug('Added timed restriction to user id %d: %s', user_id, restriction)
@@ -55,7 +55,7 @@ class RestrictionsDatabaseManager(BaseDatabaseManager, tables=tables):
     async def get_restrictions_by_user(self, user_id: int) -> 'AsyncGenerator[tuple[int, int, str, datetime, bool], None]':
         """Get restrictions for a user id."""""
         assert isinstance(user_id, int)
-        async for r in self._select('restrictions', user_id=user_id):
+        for r in await self._fetch('restrictions', user_id=user_id):
             yield r
 
     async def get_restrictions_by_type(self, type: str) -> 'AsyncGenerator[tuple[int, int, str, datetime, bool], None]':
@@ -64,9 +64,10 @@ class RestrictionsDatabaseManager(BaseDatabaseManager, tables=tables):
             yield r
 
     async def get_timed_restrictions(self) -> 'AsyncGenerator[tuple[int, int, str, datetime, bool], None]':
-        async with self.pool.acquire() as conn:
+        query = "SELECT * FROM restrictions WHERE end_date IS NOT NULL"
+        async with self._acquire('restrictions', 'select', query, lane='bulk', record=False) as conn:
             async with conn.transaction():
-                async for r in conn.cursor("SELECT * FROM restrictions WHERE end_date IS NOT NULL"):
+                async for r in self._stream(conn, 'restrictions', 'select', query):
                     yield r
 
     async def set_timed_restriction_alert(self, restriction_id: int):
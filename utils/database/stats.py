@@ -0,0 +1,59 @@
+from collections import deque
+from datetime import datetime
+from typing import TYPE_CHECKING, NamedTuple
+
+import logging
+
+from ..metrics import LatencyHistogram, RollingSamples
+
+if TYPE_CHECKING:
+    from typing import Deque, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class SlowQuery(NamedTuple):
+    date: datetime
+    table: str
+    operation: str
+    query: 'Optional[str]'
+    elapsed: float
+
+
+class QueryStats:
+    """Pool acquire waits per lane and query latencies per table and operation of the database managers."""
+
+    # Queries that hold their connection for longer than this, in seconds, are logged
+    slow_query_threshold = 0.25
+
+    def __init__(self, slow_queries_size: int = 25):
+        # Per pool lane
+        self.acquire_wait: dict[str, RollingSamples] = {}
+        self.queries: dict[tuple[str, str], LatencyHistogram] = {}
+        self.slow_queries: 'Deque[SlowQuery]' = deque(maxlen=slow_queries_size)
+
+    def record_acquire(self, lane: str, elapsed: float):
+        samples = self.acquire_wait.get(lane)
+        if samples is None:
+            samples = self.acquire_wait[lane] = RollingSamples()
+        samples.add(elapsed)
+
+    def record(self, table: str, operation: str, elapsed: float, query: 'Optional[str]' = None):
+        histogram = self.queries.get((table, operation))
+        if histogram is None:
+            histogram = self.queries[(table, operation)] = LatencyHistogram()
+        histogram.add(elapsed)
+        if elapsed >= self.slow_query_threshold:
+            self.slow_queries.append(SlowQuery(date=datetime.now(), table=table, operation=operation, query=query,
+                                               elapsed=elapsed))
+            logger.warning('Slow %s query in table %s took %.3fs: %s', operation, table, elapsed, query)
+
+    def busiest(self, limit: int = 10) -> list[tuple[str, str, LatencyHistogram]]:
+        """Returns the table, operation and latencies of the queries with the most total time."""
+        ordered = sorted(self.queries.items(), key=lambda item: item[1].total, reverse=True)
+        return [(table, operation, histogram) for (table, operation), histogram in ordered[:limit]]
+
+
+# Shared by every database manager
+query_stats = QueryStats()
@@ -30,15 +30,26 @@ class WarnsDatabaseManager(BaseDatabaseManager, tables=tables):
         assert isinstance(reason, (str, type(None))), type(str)
         await self.bot.configuration.add_member(user_id)
         now = time_snowflake(datetime.now())
-        await self._insert('warns', id=now, user_id=user_id, issuer_id=issuer, reason=reason)
+        # The count runs on the snapshot from before the insert, so the new warn is added separately
+        query = ("WITH inserted AS (INSERT INTO warns (id, user_id, issuer_id, reason) VALUES ($1, $2, $3, $4) RETURNING id) "
+                 "SELECT (SELECT COUNT(*) FROM warns WHERE user_id = $2) + (SELECT COUNT(*) FROM inserted)")
+        conn: asyncpg.Connection
+        async with self._acquire('warns', 'insert', query) as conn:
+            try:
+                count = await conn.fetchval(query, now, user_id, issuer, reason)
+            except asyncpg.IntegrityConstraintViolationError:
+                self.log.error('Exception when inserting values into table warns', exc_info=True)
+                count = None
+        if count is None:
+            # Nothing was inserted, the count is of the warns the user already has
+            return now, await self._row_count('warns', user_id=user_id)
         self.log.debug('Added warning %d to user id %d, %r', now, user_id, reason)
-        count = await self._row_count('warns', user_id=user_id)
         return now, count
 
     async def get_warnings(self, user_id: int) -> 'AsyncGenerator[WarnEntry, None]':
         """Get warnings for a user id."""
         assert isinstance(user_id, int)
-        async for warn_id, w_user_id, issuer, reason in self._select('warns', user_id=user_id):
+        for warn_id, w_user_id, issuer, reason in await self._fetch('warns', user_id=user_id):
             yield WarnEntry(user_id=w_user_id,
                             warn_id=warn_id,
                             date=snowflake_time(warn_id),
@@ -61,13 +72,24 @@ class WarnsDatabaseManager(BaseDatabaseManager, tables=tables):
         """Get a specific warning based on warn id."""
         return await self._row_count('warns', user_id=user_id)
 
-    async def delete_warning(self, warn_id: int) -> int:
-        """Remove a warning based on warn id."""
+    async def get_all_warnings_count(self) -> 'AsyncGenerator[Tuple[int, int], None]':
+        """Get the warning count of every user id with warnings."""
+        query = "SELECT user_id, COUNT(*) FROM warns GROUP BY user_id"
+        async with self._acquire('warns', 'count', query, lane='bulk', record=False) as conn:
+            async with conn.transaction():
+                async for user_id, count in self._stream(conn, 'warns', 'count', query):
+                    yield user_id, count
+
+    async def delete_warning(self, warn_id: int) -> 'Optional[int]':
+        """Remove a warning based on warn id, returns the user id of the removed warning."""
         assert isinstance(warn_id, int)
-        res = await self._delete('warns', id=warn_id)
-        if res:
+        conn: asyncpg.Connection
+        query = "DELETE FROM warns WHERE id = $1 RETURNING user_id"
+        async with self._acquire('warns', 'delete', query) as conn:
+            user_id = await conn.fetchval(query, warn_id)
+        if user_id is not None:
             self.log.debug('Removed warning %d', warn_id)
-        return res
+        return user_id
 
     async def delete_all_warnings(self, user_id: int) -> int:
         """Delete all warnings for a user id."""
@@ -92,7 +114,7 @@ class WarnsDatabaseManager(BaseDatabaseManager, tables=tables):
         query = "INSERT INTO warns VALUES ($1,$2,$3,$4) ON CONFLICT (id) DO UPDATE SET id = excluded.id+1"
         conn: asyncpg.Connection
         try:
-            async with self.pool.acquire() as conn:
+            async with self._acquire('warns', 'upsert', query) as conn:
                 async with conn.transaction():
                     await conn.executemany(query, warns)
         except asyncpg.UniqueViolationError:
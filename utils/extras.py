@@ -6,7 +6,7 @@ from collections import defaultdict
 import discord
 from discord.utils import time_snowflake
 
-from .managerbase import BaseManager
+from .managerbase import BaseManager, collect
 from .database import ExtrasDatabaseManager, Tag, TimedRole, Reminder
 
 
@@ -26,17 +26,22 @@ class ExtrasManager(BaseManager, db_manager=ExtrasDatabaseManager):
 
     def __init__(self, bot: 'Kurisu'):
         super().__init__(bot)
-        asyncio.create_task(self.setup())
+        bot.changes.subscribe('tags', self.db, self._tag_changed)
+        bot.changes.subscribe('timedroles', self.db, self._timed_role_changed)
+        bot.changes.subscribe('reminders', self.db, self._reminder_changed)
+        bot.changes.add_reload(self.setup)
 
     async def setup(self):
+        tags, timed_roles, reminders = await asyncio.gather(
+            collect(self.db.get_tags()), collect(self.db.get_timed_roles()), collect(self.db.get_reminders()))
 
-        self._tags: 'dict[str, Tag]' = {t.title: t async for t in self.db.get_tags()}
+        self._tags: 'dict[str, Tag]' = {t.title: t for t in tags}
 
-        self._timed_roles: 'list[TimedRole]' = [tr async for tr in self.db.get_timed_roles()]
+        self._timed_roles: 'list[TimedRole]' = timed_roles
 
         self._reminders = defaultdict(list)
 
-        async for r in self.db.get_reminders():
+        for r in reminders:
             self._reminders[r.author_id].append(r)
 
     @property
@@ -51,6 +56,30 @@ class ExtrasManager(BaseManager, db_manager=ExtrasDatabaseManager):
     def timed_roles(self) -> 'list[TimedRole]':
         return self._timed_roles
 
+    # changes made outside this instance
+
+    def _tag_changed(self, key: dict, row: 'Optional[tuple]'):
+        if row:
+            self._tags[row[1]] = Tag(id=row[0], title=row[1], content=row[2], author_id=row[3])
+        else:
+            self._tags.pop(key['title'], None)
+
+    def _timed_role_changed(self, key: dict, row: 'Optional[tuple]'):
+        timed_role = discord.utils.get(self._timed_roles, user_id=key['user_id'], role_id=key['role_id'])
+        if timed_role:
+            self._timed_roles.remove(timed_role)
+        if row:
+            self._timed_roles.append(TimedRole(role_id=row[1], user_id=row[2], expiring_date=row[3]))
+
+    def _reminder_changed(self, key: dict, row: 'Optional[tuple]'):
+        for reminders in self._reminders.values():
+            reminder = discord.utils.get(reminders, id=key['id'])
+            if reminder:
+                reminders.remove(reminder)
+                break
+        if row:
+            self._reminders[row[2]].append(Reminder(id=row[0], date=row[1], author_id=row[2], content=row[3]))
+
     async def add_timed_role(self, user: 'Union[Member, User, OptionalMember]', role: 'Role', expiring_date: datetime):
         res = await self.db.add_timed_role(role.id, user.id, expiring_date)
         if res:
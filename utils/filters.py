@@ -1,16 +1,162 @@
 import asyncio
 import re
-from typing import TYPE_CHECKING, Optional
+from collections import deque, OrderedDict
+from string import printable
+from time import perf_counter
+from typing import TYPE_CHECKING, NamedTuple, Optional
 
 import discord
 from Levenshtein import distance
 
-from .managerbase import BaseManager
-from .database import FiltersDatabaseManager, ApprovedInvite, FilteredWord, LevenshteinWord
+from .managerbase import BaseManager, collect
+from .metrics import StageTimings
+from .database import FiltersDatabaseManager, ApprovedInvite, FilteredWord, LevenshteinWord, FilterKind
 
 if TYPE_CHECKING:
     from kurisu import Kurisu
-    from .database import FilterKind
+
+
+non_printable_re = re.compile(f'[^{re.escape(printable)}]+')
+separators_re = re.compile(r'[ *_\-~]')
+# Matched against the reversed message so the last dot-separated pair of a hostname is found first
+reversed_domain_re = re.compile(r"([\w0-9-]+\.[\w0-9-]+)")
+invite_re = re.compile(r'(?:discordapp\.com/invite|discord\.gg|discord\.com/invite)/(\w+)')
+video_re = re.compile(r'((?:https?://)?(?:www.)?)(?:(youtube\.com/watch\?v=)|(youtu\.be/))([aA-zZ_\-\d]{11})')
+
+misinformation_urls = ('gudie.racklab', 'guide.racklab', 'gudieracklab', 'guideracklab', 'lyricly.github.io',
+                       'lyriclygithub', 'strawpoii', 'hackinformer.com', 'console.guide', 'jacksorrell.co.uk',
+                       'jacksorrell.tv', 'nintendobrew.com', 'reinx.guide', 'NxpeNwz', 'scenefolks.com', 'rentry.co')
+misinformation_re = re.compile('|'.join(re.escape(url) for url in misinformation_urls))
+
+
+class ScanContext:
+    """The normalized text and tokens of a message, computed once and shared by every filter."""
+
+    __slots__ = ('content', 'lowered', 'no_separators', 'domains', 'invite_codes', 'video_ids')
+
+    def __init__(self, content: str):
+        self.content = content
+        # Only printable characters are kept in the normalized text
+        self.lowered = non_printable_re.sub('', content.lower())
+        self.no_separators = separators_re.sub('', self.lowered)
+        self.domains: list[str] = [d[::-1] for d in reversed_domain_re.findall(content[::-1])]
+        self.invite_codes: list[str] = list(dict.fromkeys(invite_re.findall(content)))
+        self.video_ids: list[str] = [m[3] for m in video_re.findall(content)]
+
+
+class ScanResult(NamedTuple):
+    filter_result: 'dict[FilterKind, str]'
+    approved_invites: list[ApprovedInvite]
+    non_approved_invites: list[str]
+    contains_misinformation_url: bool
+    contains_video: bool
+
+    @property
+    def clean(self) -> bool:
+        """Whether the message didn't trigger anything."""
+        return not (self.filter_result or self.approved_invites or self.non_approved_invites
+                    or self.contains_misinformation_url or self.contains_video)
+
+
+class WordAutomaton:
+    """Aho-Corasick automaton over the filtered words.
+
+    Scanning a message walks it once regardless of how many words are in the filter."""
+
+    __slots__ = ('_goto', '_fail', '_output')
+
+    def __init__(self, words: 'list[FilteredWord]'):
+        self._goto: list[dict[str, int]] = [{}]
+        self._output: list[list[FilteredWord]] = [[]]
+
+        for fw in words:
+            state = 0
+            for char in fw.word:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._output.append([])
+                state = next_state
+            self._output[state].append(fw)
+
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                # Inherit the words that end at the fallback state so the scan doesn't have to follow fail links
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def search(self, message: str) -> 'dict[FilterKind, str]':
+        matches = {}
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        state = 0
+        for char in message:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for fw in output[state]:
+                # We don't care if there is many trigger words in the message of the same kind
+                # only if there is at least one
+                if fw.kind not in matches:
+                    matches[fw.kind] = fw.word
+        return matches
+
+
+class LevenshteinIndex:
+    """BK-tree over the levenshtein words.
+
+    Only the nodes that can be within the largest threshold of the searched word get their distance computed."""
+
+    __slots__ = ('_root', '_radius')
+
+    def __init__(self, words: 'list[LevenshteinWord]'):
+        # Nodes are stored as [word, {distance: child}]
+        self._root: Optional[list] = None
+        # A word matches when the distance is under its threshold, so this is the farthest a match can be
+        self._radius = max((lw.threshold for lw in words), default=1) - 1
+
+        for lw in words:
+            self._add(lw)
+
+    def _add(self, lword: LevenshteinWord):
+        if self._root is None:
+            self._root = [lword, {}]
+            return
+        node = self._root
+        while True:
+            d = distance(lword.word, node[0].word)
+            child = node[1].get(d)
+            if child is None:
+                node[1][d] = [lword, {}]
+                return
+            node = child
+
+    def search(self, word: str) -> 'list[LevenshteinWord]':
+        """Returns the levenshtein words that are under their threshold from the word."""
+        matches = []
+        if self._root is None:
+            return matches
+        radius = self._radius
+        stack = [self._root]
+        while stack:
+            lword, children = stack.pop()
+            d = distance(word, lword.word)
+            if d < lword.threshold:
+                matches.append(lword)
+            for child_d, child in children.items():
+                if d - radius <= child_d <= d + radius:
+                    stack.append(child)
+        return matches
 
 
 class FiltersManager(BaseManager, db_manager=FiltersDatabaseManager):
@@ -18,18 +164,39 @@ class FiltersManager(BaseManager, db_manager=FiltersDatabaseManager):
 
     db: FiltersDatabaseManager
 
+    # Number of distinct message contents whose scan results are kept
+    scan_cache_size = 2048
+
     def __init__(self, bot: 'Kurisu'):
         super().__init__(bot)
-        asyncio.create_task(self.setup())
+        self._version = 0
+        self._scan_cache: 'OrderedDict[str, ScanResult]' = OrderedDict()
+        self.scan_cache_hits = 0
+        self.scan_cache_misses = 0
+        # Filled in by the Events cog with the stages outside the filters
+        self.timings = StageTimings('normalization', 'filtered_words', 'levenshtein_words', 'invites', 'filters',
+                                    'enforcement', 'total')
+        bot.changes.subscribe('filteredwords', self.db, self._filtered_word_changed)
+        bot.changes.subscribe('levenshteinwords', self.db, self._levenshtein_word_changed)
+        bot.changes.subscribe('whitelistedwords', self.db, self._whitelisted_word_changed)
+        bot.changes.subscribe('approvedinvites', self.db, self._approved_invite_changed)
+        bot.changes.add_reload(self.setup)
 
     async def setup(self):
-        self._whitelist: list[str] = [wl async for wl in self.db.get_whitelisted_words()]
+        whitelist, lsh_words, filtered_words, approved_invites = await asyncio.gather(
+            collect(self.db.get_whitelisted_words()), collect(self.db.get_levenshtein_words()),
+            collect(self.db.get_filtered_words()), collect(self.db.get_approved_invites()))
+
+        self._whitelist: set[str] = set(whitelist)
 
-        self._lsh_words: 'list[LevenshteinWord]' = [wl async for wl in self.db.get_levenshtein_words()]
+        self._lsh_words: 'list[LevenshteinWord]' = lsh_words
+        self._lsh_index = LevenshteinIndex(self._lsh_words)
 
-        self._filtered_words: 'list[FilteredWord]' = [fw async for fw in self.db.get_filtered_words()]
+        self._filtered_words: 'list[FilteredWord]' = filtered_words
+        self._filtered_automaton = WordAutomaton(self._filtered_words)
 
-        self._approved_invites: 'dict[str, ApprovedInvite]' = {ai.code: ai async for ai in self.db.get_approved_invites()}
+        self._approved_invites: 'dict[str, ApprovedInvite]' = {ai.code: ai for ai in approved_invites}
+        self._invalidate()
 
     @property
     def whitelist(self):
@@ -47,12 +214,23 @@ class FiltersManager(BaseManager, db_manager=FiltersDatabaseManager):
     def approved_invites(self):
         return self._approved_invites
 
+    @property
+    def version(self) -> int:
+        """Incremented every time a filter list changes."""
+        return self._version
+
+    def _invalidate(self):
+        self._version += 1
+        self._scan_cache.clear()
+
     # fetch, insert and update operations
 
     async def add_filtered_word(self, word: str, kind: 'FilterKind'):
         res = await self.db.add_filtered_word(word, kind.value)
         if res:
             self._filtered_words.append(FilteredWord(word=word, kind=kind))
+            self._filtered_automaton = WordAutomaton(self._filtered_words)
+            self._invalidate()
         return res
 
     async def delete_filtered_word(self, word: str) -> int:
@@ -61,12 +239,16 @@ class FiltersManager(BaseManager, db_manager=FiltersDatabaseManager):
             f_word = discord.utils.get(self._filtered_words, word=word)
             if f_word:
                 self._filtered_words.remove(f_word)
+                self._filtered_automaton = WordAutomaton(self._filtered_words)
+                self._invalidate()
         return res
 
     async def add_levenshtein_word(self, word: str, threshold: int, kind: 'FilterKind') -> int:
         res = await self.db.add_levenshtein_word(word, threshold, kind.value)
         if res:
             self._lsh_words.append(LevenshteinWord(word=word, threshold=threshold, kind=kind))
+            self._lsh_index = LevenshteinIndex(self._lsh_words)
+            self._invalidate()
         return res
 
     async def delete_levenshtein_word(self, word: str) -> int:
@@ -75,30 +257,36 @@ class FiltersManager(BaseManager, db_manager=FiltersDatabaseManager):
             lsh_word = discord.utils.get(self._lsh_words, word=word)
             if lsh_word:
                 self._lsh_words.remove(lsh_word)
+                self._lsh_index = LevenshteinIndex(self._lsh_words)
+                self._invalidate()
         return res
 
     async def add_whitelisted_word(self, word: str) -> int:
         res = await self.db.add_whitelisted_word(word)
         if res:
-            self._whitelist.append(word)
+            self._whitelist.add(word)
+            self._invalidate()
         return res
 
     async def delete_whitelisted_word(self, word: str) -> int:
         res = await self.db.delete_whitelisted_word(word)
         if res:
-            self._whitelist.remove(word)
+            self._whitelist.discard(word)
+            self._invalidate()
         return res
 
     async def add_approved_invite(self, invite: discord.Invite, uses: int, alias: str):
         res = await self.db.add_approved_invite(code=invite.code, uses=uses, alias=alias)
         if res:
             self._approved_invites[invite.code] = ApprovedInvite(code=invite.code, uses=uses, alias=alias)
+            self._invalidate()
         return res
 
     async def delete_approved_invite(self, code: str):
         res = await self.db.delete_approved_invite(code)
         if res:
             del self._approved_invites[code]
+            self._invalidate()
         return res
 
     async def update_invite_use(self, code: str):
@@ -106,51 +294,120 @@ class FiltersManager(BaseManager, db_manager=FiltersDatabaseManager):
         if res:
             old = self._approved_invites[code]
             self._approved_invites[code] = ApprovedInvite(code=old.code, uses=old.uses - 1, alias=old.alias)
+            self._invalidate()
         return res
 
+    # changes made outside this instance
+
+    def _filtered_word_changed(self, key: dict, row: 'Optional[tuple]'):
+        f_word = discord.utils.get(self._filtered_words, word=key['word'])
+        if f_word:
+            self._filtered_words.remove(f_word)
+        if row:
+            self._filtered_words.append(FilteredWord(word=row[0], kind=FilterKind(row[1])))
+        self._filtered_automaton = WordAutomaton(self._filtered_words)
+        self._invalidate()
+
+    def _levenshtein_word_changed(self, key: dict, row: 'Optional[tuple]'):
+        lsh_word = discord.utils.get(self._lsh_words, word=key['word'])
+        if lsh_word:
+            self._lsh_words.remove(lsh_word)
+        if row:
+            self._lsh_words.append(LevenshteinWord(word=row[0], threshold=row[1], kind=FilterKind(row[2])))
+        self._lsh_index = LevenshteinIndex(self._lsh_words)
+        self._invalidate()
+
+    def _whitelisted_word_changed(self, key: dict, row: 'Optional[tuple]'):
+        if row:
+            self._whitelist.add(row[0])
+        else:
+            self._whitelist.discard(key['word'])
+        self._invalidate()
+
+    def _approved_invite_changed(self, key: dict, row: 'Optional[tuple]'):
+        if row:
+            self._approved_invites[row[0]] = ApprovedInvite(code=row[0], uses=row[1], alias=row[2])
+        else:
+            self._approved_invites.pop(key['code'], None)
+        self._invalidate()
+
     def get_invite_named(self, alias: str) -> Optional[ApprovedInvite]:
         return discord.utils.get(self._approved_invites.values(), alias=alias)
 
     # Filter operations
-    def match_filtered_words(self, message: str) -> 'dict[FilterKind, str]':
-        matches = {}
-        for word in self._filtered_words:
-            # We don't care if there is many trigger words in the message of the same kind
-            # only if there is at least one
-            if word.kind in matches:
-                continue
-            pos = message.find(word.word)
-            if pos != -1:
-                matches[word.kind] = word.word
-        return matches
+    def scan(self, content: str) -> ScanResult:
+        """Runs every filter over a message content.
 
-    def match_levenshtein_words(self, message: str) -> 'dict[FilterKind, str]':
-        matches = {}
-        message = message[::-1]
-        to_check: list[str] = re.findall(r"([\w0-9-]+\.[\w0-9-]+)", message)
+        Results are cached by content until a filter list changes, so repeated spam is only scanned once."""
+        result = self._scan_cache.get(content)
+        if result is not None:
+            self.scan_cache_hits += 1
+            self._scan_cache.move_to_end(content)
+            return result
+        self.scan_cache_misses += 1
+
+        start = perf_counter()
+        context = ScanContext(content)
+        normalized = perf_counter()
+        filtered_words = self.match_filtered_words(context)
+        matched_words = perf_counter()
+        levenshtein_words = self.match_levenshtein_words(context)
+        matched_levenshtein = perf_counter()
+        approved_invites, non_approved_invites = self.search_invite(context)
+        searched_invites = perf_counter()
+        result = ScanResult(filter_result=filtered_words | levenshtein_words,
+                            approved_invites=approved_invites,
+                            non_approved_invites=non_approved_invites,
+                            contains_misinformation_url=self.match_misinformation_urls(context),
+                            contains_video=bool(context.video_ids))
+        end = perf_counter()
+        timings = self.timings
+        timings.record('normalization', normalized - start)
+        timings.record('filtered_words', matched_words - normalized)
+        timings.record('levenshtein_words', matched_levenshtein - matched_words)
+        timings.record('invites', searched_invites - matched_levenshtein)
+        timings.record('filters', end - start)
+        self._scan_cache[content] = result
+        if len(self._scan_cache) > self.scan_cache_size:
+            self._scan_cache.popitem(last=False)
+        return result
+
+    @property
+    def scan_cache_entries(self) -> int:
+        return len(self._scan_cache)
 
-        for word in to_check:
-            word = word[::-1]
+    @property
+    def scan_cache_hit_rate(self) -> float:
+        total = self.scan_cache_hits + self.scan_cache_misses
+        return self.scan_cache_hits / total if total else 0.0
+
+    def match_filtered_words(self, context: ScanContext) -> 'dict[FilterKind, str]':
+        return self._filtered_automaton.search(context.no_separators)
+
+    def match_levenshtein_words(self, context: ScanContext) -> 'dict[FilterKind, str]':
+        matches = {}
+        for word in context.domains:
             # We don't care if there is many trigger words in the message of the same kind
             # only if there is at least one
             if word in self._whitelist:
                 continue
-            for lword in self._lsh_words:
-                if lword.kind in matches:
-                    continue
-                lf_distance = distance(word, lword.word)
-                if lf_distance < lword.threshold:
+            for lword in self._lsh_index.search(word):
+                if lword.kind not in matches:
                     matches[lword.kind] = lword.word
         return matches
 
-    def search_invite(self, message: str) -> tuple[list[ApprovedInvite], list[str]]:
+    def match_levenshtein_word(self, word: str) -> 'list[LevenshteinWord]':
+        return self._lsh_index.search(word)
+
+    def search_invite(self, context: ScanContext) -> tuple[list[ApprovedInvite], list[str]]:
         approved_invites = []
         non_approved_invites = []
-        res = re.findall(r'(?:discordapp\.com/invite|discord\.gg|discord\.com/invite)/(\w+)', message)
-
-        for invite_code in set(res):
+        for invite_code in context.invite_codes:
             if invite := self._approved_invites.get(invite_code):
                 approved_invites.append(invite)
             else:
                 non_approved_invites.append(invite_code)
         return approved_invites, non_approved_invites
+
+    def match_misinformation_urls(self, context: ScanContext) -> bool:
+        return misinformation_re.search(context.no_separators) is not None
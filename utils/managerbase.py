@@ -1,10 +1,22 @@
-from typing import TYPE_CHECKING
+import asyncio
+from time import perf_counter
+from typing import TYPE_CHECKING, TypeVar
 import logging
+
+from .database import memory_managers
+
 if TYPE_CHECKING:
-    from typing import Type, Optional
+    from typing import AsyncIterable, Type, Optional
     from kurisu import Kurisu
     from .database import BaseDatabaseManager
 
+T = TypeVar('T')
+
+
+async def collect(iterable: 'AsyncIterable[T]') -> 'list[T]':
+    """Collects the items of an async iterable, so table loads can be passed to asyncio.gather."""
+    return [item async for item in iterable]
+
 
 class BaseManager:
     """Base class for Kurisu managers."""
@@ -18,9 +30,63 @@ class BaseManager:
         self.log.debug('Initializing %s', type(self).__name__)
 
         if self.db_manager:
-            self.db = self.db_manager(bot)
+            if bot.memory_database is not None:
+                self.db = memory_managers[self.db_manager](bot)
+            else:
+                self.db = self.db_manager(bot)
+
+    async def setup(self):
+        """Loads the caches of the manager. Run by ManagerWarmup when the bot starts."""
 
     # until PyCharm recognizes __init_subclass__ properly, these inspections must be disabled
     # noinspection PyMethodOverriding,PyArgumentList
     def __init_subclass__(cls, *, db_manager: 'Optional[Type[BaseDatabaseManager]]' = None, **kwargs):
         cls.db_manager = db_manager
+
+
+class ManagerWarmup:
+    """Runs the setup of the managers concurrently and records how long each one took."""
+
+    def __init__(self, *managers: BaseManager):
+        self.managers = managers
+        self.log = logging.getLogger(type(self).__name__)
+        # In seconds, by manager class name
+        self.load_times: dict[str, float] = {}
+        self.failed: list[tuple[str, BaseException]] = []
+        self.elapsed: float = 0
+        self._done = asyncio.Event()
+
+    def start(self) -> 'asyncio.Task':
+        task = asyncio.create_task(self._run())
+        task.add_done_callback(self._log_failure)
+        return task
+
+    def _log_failure(self, task: 'asyncio.Task'):
+        # The setups catch their own errors, this only happens if the warmup itself broke
+        if not task.cancelled() and task.exception() is not None:
+            self.log.error('Manager warmup failed', exc_info=task.exception())
+
+    async def wait(self):
+        """Wait until every manager finished its setup or failed."""
+        await self._done.wait()
+
+    async def _setup(self, manager: BaseManager):
+        name = type(manager).__name__
+        start = perf_counter()
+        try:
+            await manager.setup()
+        except Exception as e:
+            self.log.exception('Setup of %s failed', name)
+            self.failed.append((name, e))
+        else:
+            self.load_times[name] = perf_counter() - start
+
+    async def _run(self):
+        start = perf_counter()
+        try:
+            await asyncio.gather(*(self._setup(manager) for manager in self.managers))
+        finally:
+            self.elapsed = perf_counter() - start
+            self._done.set()
+        self.log.info('Managers loaded in %.2fs: %s', self.elapsed,
+                      ', '.join(f'{name} {elapsed:.2f}s' for name, elapsed in self.load_times.items()))
@@ -0,0 +1,106 @@
+import time
+
+from bisect import bisect_left
+from collections import deque
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from typing import Deque
+
+
+class RollingSamples:
+    """Keeps the most recent samples of a value and computes percentiles over them on request."""
+
+    __slots__ = ('_samples', 'count')
+
+    def __init__(self, size: int = 2048):
+        self._samples: 'Deque[float]' = deque(maxlen=size)
+        self.count = 0
+
+    def __len__(self):
+        return len(self._samples)
+
+    def add(self, value: float):
+        self._samples.append(value)
+        self.count += 1
+
+    def percentiles(self, *percents: float) -> list[float]:
+        if not self._samples:
+            return [0.0 for _ in percents]
+        ordered = sorted(self._samples)
+        last = len(ordered) - 1
+        return [ordered[round(last * p / 100)] for p in percents]
+
+
+class ThroughputCounter:
+    """Counts events in one second buckets over the last ``window`` seconds."""
+
+    __slots__ = ('window', '_buckets', 'total')
+
+    def __init__(self, window: int = 60):
+        self.window = window
+        # (second, count) pairs, oldest first
+        self._buckets: 'Deque[list[int]]' = deque()
+        self.total = 0
+
+    def add(self, amount: int = 1):
+        second = int(time.monotonic())
+        if self._buckets and self._buckets[-1][0] == second:
+            self._buckets[-1][1] += amount
+        else:
+            self._buckets.append([second, amount])
+            while self._buckets[0][0] <= second - self.window:
+                self._buckets.popleft()
+        self.total += amount
+
+    def rate(self) -> float:
+        """Events per second over the window."""
+        limit = int(time.monotonic()) - self.window
+        return sum(count for second, count in self._buckets if second > limit) / self.window
+
+
+class StageTimings:
+    """Rolling timings of the named stages of a pipeline, in seconds."""
+
+    def __init__(self, *stages: str, size: int = 2048):
+        self.stages: dict[str, RollingSamples] = {stage: RollingSamples(size) for stage in stages}
+
+    def record(self, stage: str, elapsed: float):
+        self.stages[stage].add(elapsed)
+
+    def summary(self) -> list[tuple[str, int, float, float, float]]:
+        """Returns the stage name, the number of samples and the p50, p95 and p99 of each stage."""
+        return [(stage, samples.count, *samples.percentiles(50, 95, 99)) for stage, samples in self.stages.items()]
+
+    def format(self) -> str:
+        return '\n'.join(f'{stage}: n={count} p50={p50 * 1000:.3f}ms p95={p95 * 1000:.3f}ms p99={p99 * 1000:.3f}ms'
+                         for stage, count, p50, p95, p99 in self.summary())
+
+
+class LatencyHistogram:
+    """Counts durations, in seconds, in fixed buckets."""
+
+    __slots__ = ('bounds', 'counts', 'count', 'total')
+
+    # Upper bounds of the buckets, the last bucket has no upper bound
+    default_bounds = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+    def __init__(self, bounds: 'tuple[float, ...]' = default_bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def buckets(self) -> list[tuple[str, int]]:
+        """Returns the label and count of each bucket."""
+        labels = [f'<={bound * 1000:g}ms' for bound in self.bounds] + [f'>{self.bounds[-1] * 1000:g}ms']
+        return list(zip(labels, self.counts))
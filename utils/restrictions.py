@@ -8,7 +8,7 @@ from discord.utils import format_dt, time_snowflake
 from enum import Enum
 
 from typing import TYPE_CHECKING, NamedTuple
-from .managerbase import BaseManager
+from .managerbase import BaseManager, collect
 from .database import RestrictionsDatabaseManager
 from .utils import send_dm_message
 
@@ -71,11 +71,15 @@ class RestrictionsManager(BaseManager, db_manager=RestrictionsDatabaseManager):
 
     def __init__(self, bot: 'Kurisu'):
         super().__init__(bot)
-        asyncio.create_task(self.setup())
+        bot.changes.subscribe('restrictions', self.db, self._restriction_changed)
+        bot.changes.subscribe('softbans', self.db, self._softban_changed)
+        bot.changes.add_reload(self.setup)
 
     async def setup(self):
-        self._timed_restrictions: list[TimedRestriction] = [r async for r in self.get_timed_restrictions()]
-        self._softbans: dict[int, Softban] = {r[1]: Softban(user_id=r[1], issuer_id=r[2], reason=r[3]) async for r in self.db.get_softbans()}
+        timed_restrictions, softbans = await asyncio.gather(collect(self.get_timed_restrictions()),
+                                                            collect(self.db.get_softbans()))
+        self._timed_restrictions: list[TimedRestriction] = timed_restrictions
+        self._softbans: dict[int, Softban] = {r[1]: Softban(user_id=r[1], issuer_id=r[2], reason=r[3]) for r in softbans}
 
     @property
     def timed_restricions(self) -> list[TimedRestriction]:
@@ -164,6 +168,22 @@ class RestrictionsManager(BaseManager, db_manager=RestrictionsDatabaseManager):
             if timed_res:
                 timed_res.alerted = True
 
+    # changes made outside this instance
+
+    def _restriction_changed(self, key: dict, row: 'Optional[tuple]'):
+        timed_res = discord.utils.get(self._timed_restrictions, restriction_id=key['id'])
+        if timed_res:
+            self._timed_restrictions.remove(timed_res)
+        if row and row[3] is not None:
+            self._timed_restrictions.append(
+                TimedRestriction(restriction_id=row[0], user_id=row[1], type=row[2], end_date=row[3], alerted=row[4]))
+
+    def _softban_changed(self, key: dict, row: 'Optional[tuple]'):
+        if row:
+            self._softbans[row[1]] = Softban(user_id=row[1], issuer_id=row[2], reason=row[3])
+        else:
+            self._softbans.pop(key['user_id'], None)
+
     async def get_timed_restrictions(self):
         async for r in self.db.get_timed_restrictions():
             yield TimedRestriction(restriction_id=r[0],
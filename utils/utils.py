@@ -1,3 +1,4 @@
+import asyncio
 import datetime
 import discord
 import io
@@ -6,9 +7,13 @@ import re
 import traceback
 
 from .checks import check_staff
+from collections import defaultdict
 from discord import app_commands
 from discord.ext import commands
-from typing import Optional, Union
+from typing import Iterable, Optional, Union, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from kurisu import Kurisu
 
 
 class ConsoleColor(discord.Color):
@@ -48,6 +53,53 @@ async def send_dm_message(member: discord.Member, message: str, ctx: Optional[co
         return False
 
 
+async def _delete_channel_messages(bot: 'Kurisu', channel_id: int, message_ids: list[int]) -> int:
+    channel = bot.get_channel(channel_id)
+    # Discord refuses to bulk delete messages older than 14 days, a minute is left as margin
+    bulk_limit = discord.utils.time_snowflake(discord.utils.utcnow() - datetime.timedelta(days=14, minutes=-1))
+    to_delete_one = []
+    deleted = 0
+
+    if isinstance(channel, (discord.TextChannel, discord.VoiceChannel, discord.Thread)):
+        recent = [discord.Object(id=m) for m in message_ids if m > bulk_limit]
+        to_delete_one = [m for m in message_ids if m <= bulk_limit]
+        for i in range(0, len(recent), 100):
+            chunk = recent[i:i + 100]
+            if len(chunk) == 1:
+                to_delete_one.append(chunk[0].id)
+                continue
+            try:
+                await channel.delete_messages(chunk)
+                deleted += len(chunk)
+            except discord.HTTPException:
+                # Something in the chunk couldn't be bulk deleted, try them one by one
+                to_delete_one.extend(m.id for m in chunk)
+    else:
+        to_delete_one = message_ids
+
+    for message_id in to_delete_one:
+        try:
+            await bot.get_partial_messageable(channel_id).get_partial_message(message_id).delete()
+            deleted += 1
+        except discord.HTTPException:
+            # Already deleted, not allowed or a failed request, the rest are still deleted
+            pass
+    return deleted
+
+
+async def delete_messages(bot: 'Kurisu', messages: Iterable[tuple[int, int]]) -> int:
+    """A helper method for deleting many messages.
+
+    The messages are given as (channel_id, message_id) pairs and are bulk deleted per channel
+    when possible. Returns how many messages were deleted."""
+    by_channel: defaultdict[int, list[int]] = defaultdict(list)
+    for channel_id, message_id in messages:
+        by_channel[channel_id].append(message_id)
+    results = await asyncio.gather(*(_delete_channel_messages(bot, channel_id, message_ids)
+                                     for channel_id, message_ids in by_channel.items()))
+    return sum(results)
+
+
 async def get_user(ctx: Union[commands.Context, discord.Interaction], user_id: int) -> Optional[Union[discord.Member, discord.User]]:
     if ctx.guild and (user := ctx.guild.get_member(user_id)):
         return user
@@ -10,6 +10,7 @@ if TYPE_CHECKING:
     from . import OptionalMember
     from typing import Union, Tuple, Optional
     from discord import User
+    from kurisu import Kurisu
 
 
 # could this be made better?
@@ -43,10 +44,31 @@ class WarnsManager(BaseManager, db_manager=WarnsDatabaseManager):
 
     db: WarnsDatabaseManager
 
+    def __init__(self, bot: 'Kurisu'):
+        super().__init__(bot)
+        # Warn count of every user id with warnings, None until it is loaded
+        self._warn_counts: 'Optional[dict[int, int]]' = None
+        # Users whose warns were changed by another instance, their count is read again when it is needed
+        self._stale_counts: set[int] = set()
+        bot.changes.subscribe('warns', self.db, self._warn_changed)
+        bot.changes.add_reload(self.setup)
+
+    async def setup(self):
+        self._warn_counts = {user_id: count async for user_id, count in self.db.get_all_warnings_count()}
+        self._stale_counts = set()
+
+    def _warn_changed(self, key: dict, row: 'Optional[tuple]'):
+        if self._warn_counts is not None:
+            self._warn_counts.pop(key['user_id'], None)
+            self._stale_counts.add(key['user_id'])
+
     async def add_warning(self, user: 'Union[Member, User, OptionalMember]', issuer: 'Member', reason: 'Optional[str]' = None,
                           send_dm: bool = True, do_action: bool = True) -> 'Tuple[int, int]':
         """Add a warning to a user."""
         warn_id, count = await self.db.add_warning(user_id=user.id, issuer=issuer.id, reason=reason)
+        if self._warn_counts is not None:
+            self._warn_counts[user.id] = count
+            self._stale_counts.discard(user.id)
         if isinstance(user, Member):
             if send_dm:
                 guild = self.bot.guild
@@ -76,11 +98,20 @@ class WarnsManager(BaseManager, db_manager=WarnsDatabaseManager):
 
     async def delete_warning(self, warn_id: int):
         """Remove a warning from a user."""
-        return await self.db.delete_warning(warn_id=warn_id)
+        user_id = await self.db.delete_warning(warn_id=warn_id)
+        if user_id is not None and self._warn_counts is not None and self._warn_counts.get(user_id):
+            self._warn_counts[user_id] -= 1
+            if not self._warn_counts[user_id]:
+                del self._warn_counts[user_id]
+        return user_id
 
     async def delete_all_warnings(self, user: 'Union[Member, User, OptionalMember]'):
         """Remove all warnings from a user."""
-        return await self.db.delete_all_warnings(user.id)
+        res = await self.db.delete_all_warnings(user.id)
+        if self._warn_counts is not None:
+            self._warn_counts.pop(user.id, None)
+            self._stale_counts.discard(user.id)
+        return res
 
     async def get_warnings(self, user: 'Union[Member, User, OptionalMember]'):
         """Get warnings for a user."""
@@ -89,8 +120,19 @@ class WarnsManager(BaseManager, db_manager=WarnsDatabaseManager):
 
     async def get_warnings_count(self, user: 'Union[Member, User, OptionalMember]') -> int:
         """Get warnings count for a user."""
-        return await self.db.get_warnings_count(user.id)
+        if self._warn_counts is None:
+            return await self.db.get_warnings_count(user.id)
+        if user.id in self._stale_counts:
+            count = await self.db.get_warnings_count(user.id)
+            self._stale_counts.discard(user.id)
+            if count:
+                self._warn_counts[user.id] = count
+            return count
+        return self._warn_counts.get(user.id, 0)
 
     async def copy_warnings(self, origin: 'Union[Member, User, OptionalMember]', destination: 'Union[Member, User, OptionalMember]') -> int:
         """Copy warning from a user to another user"""
-        return await self.db.copy_all_warnings(origin.id, destination.id)
+        res = await self.db.copy_all_warnings(origin.id, destination.id)
+        if res and self._warn_counts is not None and destination.id not in self._stale_counts:
+            self._warn_counts[destination.id] = self._warn_counts.get(destination.id, 0) + res
+        return res